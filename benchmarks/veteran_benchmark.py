@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+import time
+
+from utils.opencv import init_paddleocr
+from opencv.veteran_umamusume_parsing import extract_image, TEXT_READERS
+
+def run_benchmark(path: str, ocr_mode: str, repeat: int) -> dict:
+    seconds = []
+    info = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        info = extract_image(path, ocr_mode)
+        seconds.append(time.perf_counter() - start)
+
+    return {
+        "seconds": min(seconds),
+        "info": info,
+    }
+
+def diff_info(expected: dict, actual: dict) -> list[str]:
+    if expected is None or actual is None:
+        return [] if expected == actual else ["card not found"]
+
+    ret = []
+    for key in ["name", "stats", "aptitudes"]:
+        if expected[key] != actual[key]:
+            ret.append(f"{key}: expected {expected[key]}, got {actual[key]}")
+    for key in ["unique_skills", "skills"]:
+        if sorted(expected[key]) != sorted(actual[key]):
+            ret.append(f"{key}: expected {sorted(expected[key])}, got {sorted(actual[key])}")
+    return ret
+
+def parse_args(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Compares the ocr modes of the veteran uma parser on screenshots")
+    parser.add_argument("images", nargs="+", help="veteran uma screenshots")
+    parser.add_argument("--modes", nargs="+", choices=list(TEXT_READERS), default=list(TEXT_READERS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per screenshot, the fastest one is reported")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] = None) -> int:
+    args = parse_args(argv)
+    init_paddleocr()
+
+    # the first call also pays for warming up the ocr models
+    extract_image(args.images[0], args.modes[0])
+
+    results = {mode: [] for mode in args.modes}
+    mismatches = 0
+    for path in args.images:
+        print(path)
+        for mode in args.modes:
+            result = run_benchmark(path, mode, args.repeat)
+            results[mode].append({"image": path, **result})
+
+            # the first mode is the reference the other modes are compared against
+            diffs = diff_info(results[args.modes[0]][-1]["info"], result["info"])
+            mismatches += len(diffs) > 0
+            print(f"  {mode}: {result['seconds']:.2f}s{'' if diffs else ', same result'}")
+            for diff in diffs:
+                print(f"    {diff}")
+
+    for mode in args.modes:
+        total = sum(result["seconds"] for result in results[mode])
+        print(f"{mode}: {total / len(args.images):.2f}s per screenshot")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2, default=str)
+
+    return 0 if mismatches == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,18 @@ from playwright.async_api import Browser, Page, PlaywrightContextManager, async_
 from rapidfuzz import process, fuzz
 from utils.db import Preset, SessionLocal
 from utils.parse import parse_only_numbers
-from opencv.veteran_umamusume_parsing import extract_image
+from opencv.veteran_umamusume_parsing import extract_image, PIPELINE_VERSION
 from utils.blocking import run_blocking
+from utils.config import get_veteran_ocr_mode, get_skill_cache_size
+from utils.result_cache import get_content_key, get_cached_result, set_cached_result
+from utils.skill_cache import SkillRowCache
 import os
 import io
 import asyncio
 
+# skill rows recognized on any screenshot, shared by every user
+skill_cache = SkillRowCache(get_skill_cache_size())
+
 def fuzzy_match(a: str, b: list[str]):
     best_match, _, _ = process.extractOne(a, b, scorer=fuzz.WRatio)
     return best_match
@@ -261,21 +267,44 @@ async def extract_attachment_info(bot, attachment: discord.Attachment) -> dict[s
 
     try:
         await attachment.save(file_path)
-        info = await run_blocking(bot, extract_image, file_path)
+
+        # re-posted screenshots are answered from the cache without running the parser
+        ocr_mode = get_veteran_ocr_mode()
+        cache_key = await run_blocking(bot, get_content_key, file_path, "veteran_uma", f"{PIPELINE_VERSION}:{ocr_mode}")
+        info = get_cached_result(cache_key)
+        if info is not None:
+            return info
+
+        info = await run_blocking(bot, extract_image, file_path, ocr_mode, skill_cache)
+        if info is not None:
+            set_cached_result(cache_key, "veteran_uma", info)
         return info
     finally:
         os.remove(file_path)
 
+# attachments of a message downloaded and parsed at the same time
+MAX_CONCURRENT_EXTRACTIONS = 4
+
 def hash_dict(info: dict[str, any]) -> int:
     return hash(tuple(sorted(info.items())))
 
 async def extract_attachments(bot, attachments: list[discord.Attachment]) -> list[dict[str, any]]:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_EXTRACTIONS)
+
+    async def extract(attachment: discord.Attachment):
+        async with semaphore:
+            try:
+                return await extract_attachment_info(bot, attachment)
+            except Exception:
+                return None
+
+    # download and extract the attachments concurrently, they are merged in their original order afterwards
+    infos = await asyncio.gather(*[extract(attachment) for attachment in attachments])
+
     ret = {}
 
-    # extract info
-    for attachment in attachments:
+    for info in infos:
         try:
-            info = await extract_attachment_info(bot, attachment)
             hash_info = hash(info["name"]) + hash_dict(info["stats"]) + hash_dict(info["aptitudes"])
 
             if hash_info not in ret:
@@ -403,8 +432,15 @@ async def extract_image_to_simulator(bot: discord.Client, message: discord.Messa
         await message.channel.send("No images found, expected at least one image of a veteran uma screenshot.")
         return
 
-    thread = await message.create_thread(name='analyzing...')
-    umas = await extract_attachments(bot, attachments)
+    # the attachments are downloaded while the thread is created
+    extraction = asyncio.create_task(extract_attachments(bot, attachments))
+    try:
+        thread = await message.create_thread(name='analyzing...')
+    except Exception:
+        extraction.cancel()
+        raise
+
+    umas = await extraction
 
     if len(umas) == 0:
         await thread.edit(name='failed analysis')
@@ -1,42 +1,124 @@
 import asyncio
+import json
 import time
 import discord
 import os
 from datetime import datetime
 
-from opencv.club_video_parsing import extract_video
+from opencv.club_video_parsing import extract_video, PIPELINE_VERSION
 from utils.blocking import run_blocking
 from utils.spreadsheet import get_service
+from utils.config import get_video_backend, get_video_workers, get_video_ocr_mode, get_video_adaptive_sampling
+from utils.db import SessionLocal, VideoJob, Club
+from utils.result_cache import get_content_key, get_cached_result, set_cached_result
 import uuid
 from datetime import timezone
 
-async def update_progress_message(logger_message, start_time):
-    """Updates the progress message every 5 seconds"""
-    progress_dots = ["", ".", "..", "..."]
-    dot_index = 0
-    
+STAGES = ["decode", "optimize", "detect", "ocr", "aggregate"]
+
+# jobs that are still being processed are kept here, so they can be resumed after a restart
+CHECKPOINT_DIR = './downloads/checkpoints'
+
+# message ids of the jobs being processed, a resumed job must not run twice
+running_jobs = set()
+# keeps a reference to the resumed tasks, otherwise they could be garbage collected
+resumed_tasks = set()
+
+def _get_job_path(message_id):
+    return os.path.join(CHECKPOINT_DIR, f"{message_id}.json")
+
+def _get_checkpoint_path(message_id):
+    return os.path.join(CHECKPOINT_DIR, f"{message_id}.jsonl")
+
+def _load_job(message_id):
+    try:
+        with open(_get_job_path(message_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _save_job(message: discord.Message, club, file_path):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    job = {
+        'guild_id': str(message.guild.id) if message.guild else None,
+        'channel_id': str(message.channel.id),
+        'message_id': str(message.id),
+        'club_id': club.id if club else None,
+        'file_path': file_path,
+    }
+    with open(_get_job_path(message.id), "w", encoding="utf-8") as f:
+        json.dump(job, f)
+
+def _remove_job(message_id, file_path=None):
+    for path in [_get_job_path(message_id), _get_checkpoint_path(message_id), file_path]:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+def _list_pending_jobs():
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return []
+
+    jobs = []
+    for name in os.listdir(CHECKPOINT_DIR):
+        if name.endswith(".json"):
+            job = _load_job(name[:-len(".json")])
+            if job is not None:
+                jobs.append(job)
+    return jobs
+
+def _format_duration(seconds):
+    """Format seconds as minutes and seconds"""
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
+
+def _format_progress(event, elapsed):
+    """Format the latest progress event of extract_video"""
+    if event is None:
+        return f"processing video... (elapsed: {_format_duration(elapsed)})"
+
+    if event['stage'] != 'processing':
+        return f"ordering members... (elapsed: {_format_duration(elapsed)})"
+
+    progress = event['progress']
+    content = f"processing video: {progress:.0%}" if progress is not None else "processing video..."
+
+    if event['frames_decoded'] is not None:
+        content += f"\nframes {event['frames_decoded']}/{event['frames_total']} ({event['frames_sampled']} sampled), {event['rows_detected']} rows"
+    content += f"\nOCR {event['ocr_calls']} calls, {event['ocr_cache_hits']} cache hits"
+
+    content += f"\nelapsed: {_format_duration(elapsed)}"
+    if progress:
+        # the frames left take about as long as the frames processed so far
+        content += f", ETA: {_format_duration(elapsed * (1 - progress) / progress)}"
+
+    return content
+
+async def update_progress_message(logger_message, start_time, progress):
+    """Updates the progress message every 5 seconds from the latest progress event"""
     while True:
         await asyncio.sleep(5)
         elapsed = time.time() - start_time
-        minutes, seconds = divmod(int(elapsed), 60)
-        time_str = f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
-        
+
         try:
-            await logger_message.edit(content=f"processing video{progress_dots[dot_index]} (elapsed: {time_str})")
-            dot_index = (dot_index + 1) % len(progress_dots)
+            await logger_message.edit(content=_format_progress(progress.get('event'), elapsed))
         except discord.NotFound:
             break
         except discord.HTTPException:
             break
 
-async def process_video_file(bot, file_path, logger_message):
+async def process_video_file(bot, file_path, logger_message, stats, checkpoint=None):
     """Extract club member data from video file"""
     start = time.time()
     progress_task = None
-    
+    # written from the extraction thread, read by the progress message task
+    progress = {}
+
+    def on_progress(event):
+        progress['event'] = event
+
     try:
-        progress_task = asyncio.create_task(update_progress_message(logger_message, start))
-        response = await run_blocking(bot, extract_video, file_path)
+        progress_task = asyncio.create_task(update_progress_message(logger_message, start, progress))
+        response = await run_blocking(bot, extract_video, file_path, get_video_backend(), stats, workers=get_video_workers(), ocr_mode=get_video_ocr_mode(), adaptive_sampling=get_video_adaptive_sampling(), on_progress=on_progress, checkpoint=checkpoint)
         end = time.time()
         
         if progress_task:
@@ -56,6 +138,65 @@ async def process_video_file(bot, file_path, logger_message):
                 pass
         raise e
 
+def _format_processing_summary(processing_time, stats):
+    """Format processing time and frame statistics"""
+    if stats.get('result_cache_hit'):
+        return f"Processed in {processing_time:.1f} seconds (same video as an earlier upload, reused its result)"
+
+    summary = f"Processed in {processing_time:.1f} seconds"
+
+    if stats.get('frames_sampled'):
+        summary += f" (skipped {stats['frames_skipped']}/{stats['frames_sampled']} near-duplicate frames)"
+
+    ocr_calls = stats.get('ocr_cache_hits', 0) + stats.get('ocr_cache_misses', 0)
+    if ocr_calls:
+        summary += f"\nOCR cache: {stats['ocr_cache_hits']}/{ocr_calls} hits"
+
+    stage_seconds = stats.get('stage_seconds', {})
+    if stage_seconds:
+        summary += "\nStages: " + ", ".join(f"{stage} {stage_seconds[stage]:.1f}s" for stage in STAGES if stage in stage_seconds)
+
+    return summary
+
+def _record_video_job(message, club, stats, processing_time, member_count=None, error=None):
+    """Store the stats of a video job, so slow stages can be found on real uploads"""
+    stage_seconds = stats.get('stage_seconds', {})
+    session = SessionLocal()
+
+    try:
+        session.add(VideoJob(
+            guild_id=str(message.guild.id),
+            channel_id=str(message.channel.id),
+            message_id=str(message.id),
+            club_id=club.id if club else None,
+            backend=get_video_backend(),
+            ocr_mode=get_video_ocr_mode(),
+            workers=get_video_workers(),
+            status='failed' if error else 'cached' if stats.get('result_cache_hit') else 'success',
+            error=error,
+            members=member_count,
+            processing_seconds=processing_time,
+            video_duration_ms=stats.get('video_duration_ms'),
+            frames_sampled=stats.get('frames_sampled'),
+            frames_skipped=stats.get('frames_skipped'),
+            rows_detected=stats.get('rows_detected'),
+            ocr_calls=stats.get('ocr_calls'),
+            ocr_cache_hits=stats.get('ocr_cache_hits'),
+            ocr_cache_misses=stats.get('ocr_cache_misses'),
+            decode_seconds=stage_seconds.get('decode'),
+            optimize_seconds=stage_seconds.get('optimize'),
+            detect_seconds=stage_seconds.get('detect'),
+            ocr_seconds=stage_seconds.get('ocr'),
+            aggregate_seconds=stage_seconds.get('aggregate'),
+            stats=json.dumps(stats, default=str),
+        ))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Database error while recording video job: {e}")
+    finally:
+        session.close()
+
 def format_data_for_codeblock(member_data):
     """Format extracted data for code block output"""
     if not member_data:
@@ -219,23 +360,65 @@ async def extract_video_to_club_info(bot, message: discord.Message, club):
         await message.channel.send("The attachment is not a video, expected a video recording of the club info.")
         return
 
-    logger = await message.channel.send("downloading video...")
-
-    file_path = f'./downloads/{uuid.uuid4()}.{attachment.content_type.split("/")[1]}'
+    if message.id in running_jobs:
+        return
 
+    running_jobs.add(message.id)
     try:
-        await attachment.save(file_path)
-    except Exception as e:
-        await logger.edit(content=f"Failed to download video: {e}")
-        return
+        await _extract_video_to_club_info(bot, message, club, attachment)
+    finally:
+        running_jobs.discard(message.id)
+
+async def _extract_video_to_club_info(bot, message: discord.Message, club, attachment):
+    job = _load_job(message.id)
+    # the bot was restarted while the video was processed, continue from the checkpoint
+    resumed = job is not None and os.path.exists(job['file_path'])
+
+    if resumed:
+        file_path = job['file_path']
+    else:
+        # a checkpoint without its video can not be resumed
+        _remove_job(message.id)
+        file_path = f'./downloads/{uuid.uuid4()}.{attachment.content_type.split("/")[1]}'
+
+    logger = None
+    stats = {}
+    start = time.time()
+    processing_time = None
+    cancelled = False
 
-    await logger.edit(content="downloaded video, start processing...")
-    
     try:
-        # Extract data from video
-        member_data_per_chunk, processing_time = await process_video_file(bot, file_path, logger)
+        if resumed:
+            logger = await message.channel.send("resuming video processing...")
+        else:
+            logger = await message.channel.send("downloading video...")
+
+            try:
+                await attachment.save(file_path)
+            except Exception as e:
+                await logger.edit(content=f"Failed to download video: {e}")
+                return
+
+            _save_job(message, club, file_path)
+            await logger.edit(content="downloaded video, start processing...")
+
+        # the same recording is often posted more than once, the settings could change the result as well
+        version = f"{PIPELINE_VERSION}:{get_video_backend()}:{get_video_ocr_mode()}:{'adaptive' if get_video_adaptive_sampling() else 'fixed'}"
+        cache_key = await run_blocking(bot, get_content_key, file_path, "club_video", version)
+        member_data_per_chunk = get_cached_result(cache_key)
+
+        if member_data_per_chunk is not None:
+            stats['result_cache_hit'] = True
+            processing_time = time.time() - start
+        else:
+            # Extract data from video
+            member_data_per_chunk, processing_time = await process_video_file(bot, file_path, logger, stats, checkpoint=_get_checkpoint_path(message.id))
+            set_cached_result(cache_key, "club_video", member_data_per_chunk)
+
+        summary = _format_processing_summary(processing_time, stats)
         # flat the list from {}[][] to {}[]
         member_data = [item for sublist in member_data_per_chunk for item in sublist]
+        _record_video_job(message, club, stats, processing_time, len(member_data))
         
         if club.spreadsheet_id:
             # Club has spreadsheet enabled
@@ -244,7 +427,7 @@ async def extract_video_to_club_info(bot, message: discord.Message, club):
             success, message_text = await update_spreadsheet(club, member_data)
             
             if success:
-                await logger.edit(content=f"{message_text}\nProcessed in {processing_time:.1f} seconds")
+                await logger.edit(content=f"{message_text}\n{summary}")
             else:
                 await logger.edit(content=f"Processing completed in {processing_time:.1f} seconds, but spreadsheet update failed: {message_text}")
         else:
@@ -253,9 +436,46 @@ async def extract_video_to_club_info(bot, message: discord.Message, club):
             
             codeblock = f"```\n{header_line}\n{data_line}\n```"
             
-            await logger.edit(content=f"Processed in {processing_time:.1f} seconds\n\n{codeblock}")
+            await logger.edit(content=f"{summary}\n\n{codeblock}")
             
+    except asyncio.CancelledError:
+        # the bot is shutting down, the files are kept so the job is resumed on the next start
+        cancelled = True
+        raise
     except Exception as e:
-        await logger.edit(content=f"Failed to process video: {e}")
+        if processing_time is None:
+            # the extraction itself failed, not the spreadsheet update
+            _record_video_job(message, club, stats, time.time() - start, error=str(e))
+        if logger is not None:
+            await logger.edit(content=f"Failed to process video: {e}")
     finally:
-        os.remove(file_path)
+        # the files of a job interrupted by a shutdown are kept, a job that was never saved can not be resumed
+        if not cancelled or _load_job(message.id) is None:
+            _remove_job(message.id, file_path)
+
+async def resume_video_jobs(bot):
+    """Resumes the video jobs that were interrupted by a restart"""
+    for job in _list_pending_jobs():
+        try:
+            channel = bot.get_channel(int(job['channel_id'])) or await bot.fetch_channel(int(job['channel_id']))
+            message = await channel.fetch_message(int(job['message_id']))
+        except discord.HTTPException as e:
+            print(f"Dropping video job {job['message_id']}: {e}")
+            _remove_job(job['message_id'], job['file_path'])
+            continue
+
+        session = SessionLocal()
+        try:
+            club = session.query(Club).filter(Club.id == job['club_id']).first()
+        finally:
+            session.close()
+
+        if club is None:
+            print(f"Dropping video job {job['message_id']}: club not found")
+            _remove_job(job['message_id'], job['file_path'])
+            continue
+
+        print(f"Resuming video job {job['message_id']}")
+        task = asyncio.create_task(extract_video_to_club_info(bot, message, club))
+        resumed_tasks.add(task)
+        task.add_done_callback(resumed_tasks.discard)
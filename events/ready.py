@@ -2,6 +2,7 @@ import discord
 from utils.loader import sync_commands
 from utils.db import init_db, engine, SessionLocal
 from utils.discord import event, get_client
+from .channel_listeners.extract_video_to_club_info import resume_video_jobs
 
 @event
 async def on_ready():
@@ -36,3 +37,6 @@ async def on_ready():
 
     print(f'Invite link: {invite_link}')
     await sync_commands()
+
+    # continue the video jobs interrupted by the last shutdown
+    await resume_video_jobs(client)
@@ -1,12 +1,37 @@
+from bisect import bisect_left, bisect_right
 from collections import Counter
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import multiprocessing
+import threading
+import time
+import typing
 import cv2
 import numpy as np
 from cv2.typing import MatLike
-from utils.opencv import ocr
-
-# TODO: to further optimize the video parsing, we could capture the scrollbar to obtain the max height of the club lsit
+from utils.opencv import (
+    hex_to_bgr,
+    get_buffer,
+    create_color_mask,
+    to_gray,
+    remove_noise,
+    find_white_regions,
+    expand_white_areas,
+    shrink_white_areas,
+    crop_image,
+)
+from utils.opencv import get_ocr, ocr_lock, get_text_recognizer, text_recognizer_predict_lock, init_paddleocr, is_paddleocr_initialized, image_fingerprint
+from utils.cache import LRUCache
+from utils.pipeline import run_pipeline
+from utils.checkpoint import Checkpoint
+from opencv.video_sampling import sample_frames, get_video_info, SamplingRate
 
 # constants
+
+# bump whenever a change alters the extracted results, cached results of older versions are ignored
+PIPELINE_VERSION = "1"
+
 TRUE_RATIO = 3.89
 MIN_RATIO = TRUE_RATIO - 0.2
 MAX_RATIO = TRUE_RATIO + 0.2
@@ -17,6 +42,13 @@ ROW_HEADER_COLOR = "#e4ddd2"
 ROW_BACKGROUND_COLOR = "#ffffff"
 ROW_SELF_BACKGROUND_COLOR = "#fff4c6"
 ROW_KEY_BACKGROUND = "#ece7e4"
+# the self indicator background is yellow instead of white, match it as any other member background
+ROW_COLORS = [
+    ROW_HEADER_COLOR,
+    ROW_BACKGROUND_COLOR,
+    ROW_KEY_BACKGROUND,
+    (ROW_SELF_BACKGROUND_COLOR, 10),
+]
 # == 
 ICON_I_GRADIENT_TOP_COLOR = "#ffffff"
 ICON_I_GRADIENT_BOTTOM_COLOR = "#fafafa"
@@ -24,9 +56,163 @@ ICON_I_GRADIENT_BOTTOM_COLOR = "#fafafa"
 LEADER_FLAG_COLOR = "#ef3c39"
 OFFICER_FLAG_COLOR = "#267fe9"
 MEMBER_FLAG_COLOR = "#5dca10"
+# ===
+# landscape frames are decoded at this height, portrait frames at this width, either way
+# the club panel ends up around the canonical width before it is cropped and scaled to it
+WORKING_HEIGHT = 960
+PORTRAIT_WORKING_WIDTH = 600
+CANONICAL_PANEL_WIDTH = 540
+# the pixel thresholds were tuned on desktop captures where the panel is 540px wide,
+# they follow the canonical width through this scale
+PANEL_SCALE = CANONICAL_PANEL_WIDTH / 540
+CLUB_HEADER_MIN_AREA = round(4000 * PANEL_SCALE ** 2)
+PANEL_MARGIN = round(10 * PANEL_SCALE)
+ROW_HEADER_MIN_AREA = round(2 * PANEL_SCALE ** 2)
+ROW_HEADER_SHRINK_RADIUS = max(round(1 * PANEL_SCALE), 1)
+ROW_HEADER_MIN_SIZE = round(10 * PANEL_SCALE)
+ROW_MIN_AREA = round(5 * PANEL_SCALE ** 2)
+ROW_EXPAND_RADIUS = max(round(2 * PANEL_SCALE), 1)
+# rows are found on the panel downscaled by this factor, then only their edges are located
+# at full resolution within this many pixels of the coarse edges
+ROW_DETECTION_DOWNSCALE = 2
+ROW_REFINE_MARGIN = 3 * ROW_DETECTION_DOWNSCALE
+ROW_REFINE_MIN_FILL = 0.5
+# ===
+SAMPLING_FPS = 12
+# the adaptive sampling aims for rows moving this fraction of a row height between samples
+ADAPTIVE_MIN_FPS = 4
+ADAPTIVE_MAX_FPS = 30
+# the phase correlation aliases when the rows move by a whole row between two samples,
+# so the rate keeps the scroll well under half a row per sample
+ADAPTIVE_TARGET_ROW_OFFSET = 0.25
+# the rate only goes down after the list stayed still for this long
+ADAPTIVE_STILL_MS = 500
+# frames are compared on the member list of the normalized panel, downscaled so a row stays about
+# 30 pixels tall, mean absolute difference in 0-255 units
+FRAME_SIGNATURE_DOWNSCALE = 4
+FRAME_DIFF_THRESHOLD = 1.5
+# ===
+OCR_CACHE_SIZE = 4096
+OCR_BATCH_SIZE = 16
+# field regions of a row crop as fractions of its size (x, y, w, h), used by the "fields" ocr mode
+ROW_ROLE_REGION = (0.0, 0.0, 0.215, 1.0)
+ROW_NAME_REGION = (0.215, 0.0, 0.555, 0.25)
+ROW_TOTAL_FANS_REGION = (0.55, 0.32, 0.43, 0.3)
+ROW_LAST_LOGIN_REGION = (0.55, 0.64, 0.43, 0.3)
+ROLE_FLAG_COLORS = {
+    "leader": LEADER_FLAG_COLOR,
+    "officer": OFFICER_FLAG_COLOR,
+    "member": MEMBER_FLAG_COLOR,
+}
+ROLE_FLAG_MIN_RATIO = 0.01
+# the field regions are fractions of the row layout, the first rows of every job are also read
+# by the full ocr and the job switches to it when the two disagree
+FIELDS_CHECK_ROWS = 8
+# a row is settled once this many identical reads agree, later sightings skip ocr
+CONSENSUS_READS = 3
+# ===
+PIPELINE_QUEUE_SIZE = 8
+# ===
+# the club panel is locked after being found at the same place in this many consecutive frames
+PANEL_LOCK_FRAMES = 3
+PANEL_LOCK_TOLERANCE = round(4 * PANEL_SCALE)
+PANEL_REVALIDATE_INTERVAL = 24
+# ===
+# the scrollbar thumb is searched right of the member rows, its size and position tell
+# which part of the member list is visible in the frame
+SCROLLBAR_MIN_STRIP_WIDTH = 3
+SCROLLBAR_MIN_CONTRAST = 12
+COVERAGE_BUCKETS = 100
+COVERAGE_MIN_READS = 3
+# ===
+# rows are shifted by the scroll offset measured on a narrow vertical strip of the list,
+# the full detection only runs when the offset is unreliable or new rows could have appeared
+ROW_TRACK_STRIP = (0.25, 0.45)
+ROW_TRACK_MIN_RESPONSE = 0.2
+ROW_TRACK_MATCH_TOLERANCE = round(8 * PANEL_SCALE)
+ROW_TRACK_FULL_DETECTION_INTERVAL = 12
+# a tracked row must still show the same name, its name region is searched this far around the box
+ROW_TRACK_NAME_MARGIN = round(4 * PANEL_SCALE)
+# normalized correlation of the name regions, the same row reads above 0.94 and different rows below 0.88
+ROW_TRACK_MIN_SIMILARITY = 0.9
+# names of a track are only merged when they could be misreads of each other
+RELABEL_MIN_NAME_SIMILARITY = 0.8
+# segments overlap so every worker warms up on frames the previous worker has already seen
+SEGMENT_OVERLAP_MS = 1000
+# minimum seconds between two progress events
+PROGRESS_INTERVAL = 1.0
+
+# ocr results keyed by the fingerprint of the cleaned row crop, shared across jobs
+ocr_cache = LRUCache(OCR_CACHE_SIZE)
 
 # main functions
 
+def add_stage_time(stats: dict, stage: str, start: float):
+    # seconds spent in each stage of the job, summed over all frames and batches
+    if stats is None:
+        return
+
+    stage_seconds = stats.setdefault("stage_seconds", {})
+    stage_seconds[stage] = stage_seconds.get(stage, 0.0) + time.perf_counter() - start
+
+def time_stage(items, stats: dict, stage: str):
+    # the time a generator spends producing its items, like decoding the next sampled frame
+    start = time.perf_counter()
+    for item in items:
+        add_stage_time(stats, stage, start)
+        yield item
+        start = time.perf_counter()
+    add_stage_time(stats, stage, start)
+
+class ProgressReporter:
+    # sends snapshots of the job stats to the on_progress callback of extract_video,
+    # at most once per interval, from whichever thread reports the progress
+
+    def __init__(self, on_progress: typing.Callable[[dict], None], stats: dict, info: dict, interval: float = PROGRESS_INTERVAL):
+        self.on_progress = on_progress
+        self.stats = stats
+        self.duration_ms = info["duration_ms"]
+        self.frame_count = info["frame_count"]
+        self.interval = interval
+        self.position_ms = 0
+        self.started = time.perf_counter()
+        self.last_report = None
+        self.lock = threading.Lock()
+
+    def report(self, stage: str, position_ms: float = None, force: bool = False):
+        if self.on_progress is None:
+            return
+
+        now = time.perf_counter()
+        with self.lock:
+            if position_ms is not None:
+                self.position_ms = max(self.position_ms, position_ms)
+            if not force and self.last_report is not None and now - self.last_report < self.interval:
+                return
+            self.last_report = now
+
+            progress = min(self.position_ms / self.duration_ms, 1.0) if self.duration_ms > 0 else None
+            event = {
+                "stage": stage,
+                "progress": progress,
+                "elapsed": now - self.started,
+                "frames_decoded": int(self.frame_count * progress) if progress is not None else None,
+                "frames_total": self.frame_count,
+                "frames_sampled": self.stats.get("frames_sampled", 0),
+                "rows_detected": self.stats.get("rows_detected", 0),
+                "ocr_calls": self.stats.get("ocr_calls", 0),
+                "ocr_cache_hits": self.stats.get("ocr_cache_hits", 0),
+                "stage_seconds": dict(self.stats.get("stage_seconds", {})),
+            }
+
+        self.on_progress(event)
+
+def report_progress(frames, progress: ProgressReporter):
+    for timestamp, frame in frames:
+        if progress is not None:
+            progress.report("processing", timestamp)
+        yield timestamp, frame
+
 def load_screenshot(filepath: str):
     image = cv2.imread(filepath)
     if image is None:
@@ -34,118 +220,19 @@ def load_screenshot(filepath: str):
     
     return image
 
-def hex_to_bgr(hex_color):
-    hex_color = hex_color.lstrip('#')
-    r = int(hex_color[0:2], 16)
-    g = int(hex_color[2:4], 16) 
-    b = int(hex_color[4:6], 16)
-    return np.array([b, g, r])
-
-def replace_color(image: MatLike, from_color: str, to_color: str, tolerance: int = 0) -> MatLike:
-    from_bgr = hex_to_bgr(from_color)
-    to_bgr = hex_to_bgr(to_color)
-    
-    diff = np.abs(image.astype(np.int16) - from_bgr.astype(np.int16))
-    mask = np.all(diff <= tolerance, axis=2)
-    
-    result = image.copy()
-    result[mask] = to_bgr
-    
-    return result
-
-def create_binary_mask(image: MatLike, target_colors: list[str], tolerance: int = 0) -> MatLike:
-    combined_mask = np.zeros(image.shape[:2], dtype=bool)
-    
-    for color in target_colors:
-        target_bgr = hex_to_bgr(color)
-        diff = np.abs(image.astype(np.int16) - target_bgr.astype(np.int16))
-        color_mask = np.all(diff <= tolerance, axis=2)
-        combined_mask = combined_mask | color_mask
-    
-    binary_image = np.zeros_like(image)
-    binary_image[combined_mask] = [255, 255, 255]
-    binary_image[~combined_mask] = [0, 0, 0]
-    
-    return binary_image
-
-def remove_noise(image: MatLike, min_area: int = 50) -> MatLike:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    contours, _ = cv2.findContours(gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    result = image.copy()
-    result_gray = gray.copy()
-    
-    removed_count = 0
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area < min_area:
-            cv2.fillPoly(result_gray, [contour], 0)
-            removed_count += 1
-    
-    result = cv2.cvtColor(result_gray, cv2.COLOR_GRAY2BGR)
-    
-    return result
-
-def find_white_regions(image: MatLike, threshold: float = 0.5, min_width: int = 50, min_height: int = 20) -> list[tuple[int, int, int, int]]:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    contours, _ = cv2.findContours(gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    bounding_boxes = []
-    
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        
-        # cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-        if w < min_width or h < min_height:
-            continue
-        
-        roi = gray[y:y+h, x:x+w]
-        white_pixels = np.sum(roi == 255)
-        total_pixels = roi.size
-        white_ratio = white_pixels / total_pixels
-        
-        if white_ratio >= threshold:
-            bounding_boxes.append((x, y, w, h))
-    
-    return bounding_boxes
-
-def expand_white_areas(image: MatLike, radius: int) -> MatLike:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    kernel_size = 2 * radius + 1
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-    
-    expanded = cv2.dilate(gray, kernel, iterations=1)
-    
-    result = cv2.cvtColor(expanded, cv2.COLOR_GRAY2BGR)
-    
-    return result
-
-def shrink_white_areas(image: MatLike, radius: int) -> MatLike:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    kernel_size = 2 * radius + 1
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-    
-    shrunk = cv2.erode(gray, kernel, iterations=1)
-    
-    result = cv2.cvtColor(shrunk, cv2.COLOR_GRAY2BGR)
-    
-    return result
-
 def find_contours_containing_boxes(
     image: MatLike,
     target_boxes: list[tuple[int, int, int, int]],
     min_ratio: float = MIN_RATIO,
     max_ratio: float = MAX_RATIO,
 ) -> list[tuple[int, int, int, int]]:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    contours, _ = cv2.findContours(gray, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contours, _ = cv2.findContours(to_gray(image), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
     
     matching_contour_boxes = []
+
+    # the target boxes are indexed by their top edge, so each contour only checks the targets starting inside it
+    target_boxes = sorted(target_boxes, key=lambda box: box[1])
+    target_tops = [box[1] for box in target_boxes]
     
     for contour in contours:
         contour_x, contour_y, contour_w, contour_h = cv2.boundingRect(contour)
@@ -158,11 +245,14 @@ def find_contours_containing_boxes(
         if not (min_ratio <= aspect_ratio <= max_ratio):
             continue
 
-        for target_x, target_y, target_w, target_h in target_boxes:
+        contour_x2 = contour_x + contour_w
+        contour_y2 = contour_y + contour_h
+        start = bisect_left(target_tops, contour_y)
+        end = bisect_right(target_tops, contour_y2)
+
+        for target_x, target_y, target_w, target_h in target_boxes[start:end]:
             target_x2 = target_x + target_w
             target_y2 = target_y + target_h
-            contour_x2 = contour_x + contour_w
-            contour_y2 = contour_y + contour_h
             
             if (contour_x <= target_x and contour_y <= target_y and 
                 contour_x2 >= target_x2 and contour_y2 >= target_y2 and
@@ -172,31 +262,85 @@ def find_contours_containing_boxes(
     
     return matching_contour_boxes
 
-def detect_player_rows(image: MatLike):
-    # replace self indicator background color from yellow to white, which is any other member background color
-    p_image = replace_color(image, ROW_SELF_BACKGROUND_COLOR, ROW_BACKGROUND_COLOR, 10)
+def find_row_boxes(image: MatLike, buffers: dict = None, downscale: int = 1):
+    # the pixel thresholds are given at full resolution and shrink with the image
+    shape = image.shape[:2]
+    scratch = get_buffer(buffers, "scratch", shape)
+
+    headers = create_color_mask(image, [ROW_HEADER_COLOR], 5, get_buffer(buffers, "headers", shape), scratch)
+    headers = remove_noise(headers, max(ROW_HEADER_MIN_AREA // downscale ** 2, 1))
+    headers = shrink_white_areas(headers, max(ROW_HEADER_SHRINK_RADIUS // downscale, 1), get_buffer(buffers, "headers_shrunk", shape))
+    headers = find_white_regions(headers, 0.5, ROW_HEADER_MIN_SIZE / downscale, ROW_HEADER_MIN_SIZE / downscale)
+
+    rows = create_color_mask(image, ROW_COLORS, 5, get_buffer(buffers, "rows", shape), scratch)
+    rows = remove_noise(rows, max(ROW_MIN_AREA // downscale ** 2, 1))
+    rows = expand_white_areas(rows, max(ROW_EXPAND_RADIUS // downscale, 1), get_buffer(buffers, "rows_expanded", shape))
+    return find_contours_containing_boxes(rows, headers)
+
+def get_fill_ratios(image: MatLike, axis: int, colors: list = ROW_COLORS) -> np.ndarray:
+    # fraction of row colored pixels of every row (axis 1) or column (axis 0) of the image
+    mask = create_color_mask(image, colors, 5)
+    return cv2.reduce(mask, axis, cv2.REDUCE_AVG, dtype=cv2.CV_32F).ravel() / 255
+
+def refine_row_box(image: MatLike, box: tuple[int, int, int, int], margin: int = ROW_REFINE_MARGIN):
+    # the coarse box is only off by a few pixels, so the exact edges are searched in thin
+    # bands around the coarse top and bottom edges instead of masking the whole row again
+    x, y, w, h = box
+    left, right = max(x - margin, 0), min(x + w + margin, image.shape[1])
+
+    # the bands could reach into the neighbouring rows, the edge is where the gap between the rows ends
+    top_band = max(y - margin, 0)
+    top_band_image = image[top_band:y + margin, left:right]
+    top_gaps = np.flatnonzero(get_fill_ratios(top_band_image, 1) < ROW_REFINE_MIN_FILL)
+
+    bottom_band = max(y + h - margin, 0)
+    bottom_gaps = np.flatnonzero(get_fill_ratios(image[bottom_band:y + h + margin, left:right], 1) < ROW_REFINE_MIN_FILL)
+
+    if len(top_gaps) == 0 or top_gaps[-1] == top_band_image.shape[0] - 1 or len(bottom_gaps) == 0 or bottom_gaps[0] == 0:
+        return box
 
-    headers = remove_noise(create_binary_mask(p_image, [ROW_HEADER_COLOR], 5), 2)
-    headers = shrink_white_areas(headers, 1)
-    headers = find_white_regions(headers, 0.5, 10, 10)
+    # the top of the row spans its whole width, the columns are measured there
+    top_offset = top_gaps[-1] + 1
+    columns = np.flatnonzero(get_fill_ratios(top_band_image[top_offset:], 0) >= ROW_REFINE_MIN_FILL)
+    if len(columns) == 0:
+        return box
+
+    top = top_band + top_offset
+    bottom = bottom_band + bottom_gaps[0]
+    return int(left + columns[0]), int(top), int(columns[-1] - columns[0] + 1), int(bottom - top)
+
+def detect_player_rows(image: MatLike, buffers: dict = None, downscale: int = ROW_DETECTION_DOWNSCALE):
+    if downscale <= 1:
+        return find_row_boxes(image, buffers)
+
+    # nearest neighbour keeps the exact row colors the masks look for
+    size = (image.shape[1] // downscale, image.shape[0] // downscale)
+    small = cv2.resize(image, size, dst=get_buffer(buffers, "downscaled", (size[1], size[0], 3)), interpolation=cv2.INTER_NEAREST)
+    boxes = find_row_boxes(small, buffers, downscale)
+
+    return [
+        refine_row_box(image, (x * downscale, y * downscale, w * downscale, h * downscale))
+        for x, y, w, h in boxes
+    ]
 
-    p_image = create_binary_mask(p_image, [
-        ROW_HEADER_COLOR,
-        ROW_BACKGROUND_COLOR,
-        ROW_KEY_BACKGROUND,
-    ], 5)
-    p_image = remove_noise(p_image, 5)
-    p_image = expand_white_areas(p_image, 2)
-    boxes = find_contours_containing_boxes(p_image, headers)
+def get_resized_size(width: int, height: int, target_height: int = WORKING_HEIGHT) -> tuple[int, int]:
+    # the club panel spans the whole width of portrait recordings from phones, so they are
+    # scaled by their width instead, small recordings are never scaled up
+    if height > width:
+        if width <= PORTRAIT_WORKING_WIDTH:
+            return width, height
+        return PORTRAIT_WORKING_WIDTH, int(height * PORTRAIT_WORKING_WIDTH / width)
 
-    return boxes
+    return int(width * target_height / height), target_height
 
 def resize_image(image: MatLike, height: int) -> MatLike:
-    # if the image is screenshoted from mobile, return the original image
-    if image.shape[0] / 2 > image.shape[1]:
+    size = get_resized_size(image.shape[1], image.shape[0], height)
+
+    # frames could be already resized by the decoder
+    if size == (image.shape[1], image.shape[0]):
         return image
 
-    return cv2.resize(image, (int(image.shape[1] * height / image.shape[0]), height))
+    return cv2.resize(image, size)
 
 def fill_area(image: MatLike, area: tuple[int, int, int, int], color: str) -> MatLike:
     x, y, w, h = area
@@ -218,7 +362,7 @@ def cleanup_image_before_ocr(image: MatLike) -> MatLike:
         int(image.shape[1] * 0.8),
         int(h * 0.8),
     ))
-    mask = create_binary_mask(header_row, [ICON_I_GRADIENT_TOP_COLOR, ICON_I_GRADIENT_BOTTOM_COLOR], 10)
+    mask = create_color_mask(header_row, [ICON_I_GRADIENT_TOP_COLOR, ICON_I_GRADIENT_BOTTOM_COLOR], 10)
     mask = expand_white_areas(mask, int(h / 7.5))
     areas = find_white_regions(mask, 0.5, h * 0.5, h * 0.5) # 0.8 for margin of error
 
@@ -232,17 +376,108 @@ def cleanup_image_before_ocr(image: MatLike) -> MatLike:
     
     return image
 
-def ocr_image(image: MatLike) -> list[str]:
-    results = ocr.predict(cleanup_image_before_ocr(image))
-    return results[0]["rec_texts"]
+def read_rows_full(images: list[MatLike]) -> list[tuple[str, str, int, int]]:
+    with ocr_lock:
+        results = get_ocr().predict(images)
+    ret = []
+    for result in results:
+        success, data = extract_from_ocr_results(result["rec_texts"])
+        ret.append(data if success else None)
+    return ret
 
-def crop_image(image: MatLike, box: tuple[int, int, int, int]):
-    x, y, w, h = box
-    return image[y:y+h, x:x+w]
+def crop_relative(image: MatLike, region: tuple[float, float, float, float]) -> MatLike:
+    x, y, w, h = region
+    return crop_image(image, (
+        int(image.shape[1] * x),
+        int(image.shape[0] * y),
+        max(int(image.shape[1] * w), 1),
+        max(int(image.shape[0] * h), 1),
+    ))
+
+def detect_role(image: MatLike) -> str:
+    # the role flag is told apart by its color, no need to read it
+    flag = crop_relative(image, ROW_ROLE_REGION)
+    counts = {role: cv2.countNonZero(create_color_mask(flag, [color], 30)) for role, color in ROLE_FLAG_COLORS.items()}
+    role = max(counts, key=counts.get)
+    return role if counts[role] >= flag.shape[0] * flag.shape[1] * ROLE_FLAG_MIN_RATIO else None
+
+def read_rows_fields(images: list[MatLike]) -> list[tuple[str, str, int, int]]:
+    # the row layout is fixed, so only the recognition model runs on the name and value regions
+    regions = [ROW_NAME_REGION, ROW_TOTAL_FANS_REGION, ROW_LAST_LOGIN_REGION]
+    crops = [crop_relative(image, region) for image in images for region in regions]
+    with text_recognizer_predict_lock:
+        results = get_text_recognizer().predict(crops)
+    texts = [result["rec_text"].strip() for result in results]
+
+    ret = []
+    for idx, image in enumerate(images):
+        name, total_fans, last_login = texts[idx * len(regions):(idx + 1) * len(regions)]
+        role = detect_role(image)
+
+        if role is None or name == '' or not any(ch.isdigit() for ch in total_fans) or not any(ch.isdigit() for ch in last_login):
+            ret.append(None)
+            continue
+
+        ret.append((role, name, parse_only_numbers(total_fans), parse_last_login(last_login.lower())))
+    return ret
 
-def get_optimization_info(image: MatLike):
-    step1 = create_binary_mask(image, [CLUB_HEADER_COLOR], 50)
-    step2 = remove_noise(step1, 4000)
+ROW_READERS = {
+    "full": read_rows_full,
+    "fields": read_rows_fields,
+}
+
+def read_player_rows(images: list[MatLike], stats: dict = None, mode: str = "full") -> list[tuple[str, str, int, int]]:
+    if mode not in ROW_READERS:
+        raise Exception(f"Unknown ocr mode: {mode}")
+
+    start = time.perf_counter()
+    cleaned_images = [cleanup_image_before_ocr(image) for image in images]
+    keys = [f"{mode}:{image_fingerprint(image)}" for image in cleaned_images]
+    # unreadable rows are cached as False, None means the row has not been read yet
+    ret = [ocr_cache.get(key) for key in keys]
+
+    # the same row could show up more than once in a batch, only ocr it once
+    pending: dict[str, list[int]] = {}
+    for idx, data in enumerate(ret):
+        if data is None:
+            pending.setdefault(keys[idx], []).append(idx)
+
+    if stats is not None:
+        stats["ocr_cache_hits"] = stats.get("ocr_cache_hits", 0) + len(ret) - len(pending)
+        stats["ocr_cache_misses"] = stats.get("ocr_cache_misses", 0) + len(pending)
+
+    if len(pending):
+        pending_images = [cleaned_images[indices[0]] for indices in pending.values()]
+
+        batch_start = time.perf_counter()
+        results = ROW_READERS[mode](pending_images)
+        print(f"club video: ocr batch of {len(pending)} crops took {time.perf_counter() - batch_start:.2f}s")
+        ocr_calls = 1
+
+        # rows the field reader could not make sense of go through the full ocr
+        fallbacks = [idx for idx, data in enumerate(results) if data is None]
+        if mode != "full" and len(fallbacks):
+            for idx, data in zip(fallbacks, read_rows_full([pending_images[idx] for idx in fallbacks])):
+                results[idx] = data
+            ocr_calls += 1
+            if stats is not None:
+                stats["ocr_field_fallbacks"] = stats.get("ocr_field_fallbacks", 0) + len(fallbacks)
+
+        if stats is not None:
+            stats["ocr_calls"] = stats.get("ocr_calls", 0) + ocr_calls
+
+        for (key, indices), data in zip(pending.items(), results):
+            ocr_cache.put(key, data or False)
+            for idx in indices:
+                ret[idx] = data or False
+
+    add_stage_time(stats, "ocr", start)
+    return [data or None for data in ret]
+
+def get_optimization_info(image: MatLike, buffers: dict = None):
+    shape = image.shape[:2]
+    step1 = create_color_mask(image, [CLUB_HEADER_COLOR], 50, get_buffer(buffers, "club_header", shape))
+    step2 = remove_noise(step1, CLUB_HEADER_MIN_AREA)
 
     boxes = find_white_regions(
         step2,
@@ -259,32 +494,165 @@ def get_optimization_info(image: MatLike):
     
     return boxes[0]
 
-def optimize(image: MatLike):
-    resized_image = resize_image(image, 960)
-    info = get_optimization_info(resized_image)
+def is_same_box(a: tuple[int, int, int, int], b: tuple[int, int, int, int], tolerance: int = PANEL_LOCK_TOLERANCE) -> bool:
+    return all(abs(e1 - e2) <= tolerance for e1, e2 in zip(a, b))
+
+def is_club_header_visible(image: MatLike, box: tuple[int, int, int, int]) -> bool:
+    x, y, w, h = box
+    if x + w > image.shape[1] or y + h > image.shape[0]:
+        return False
+
+    # only the header box itself is masked, which is a tiny fraction of the frame
+    mask = create_color_mask(crop_image(image, box), [CLUB_HEADER_COLOR], 50)
+    return cv2.countNonZero(mask) >= mask.size * 0.5
+
+class ClubPanelLocator:
+    # the club panel does not move during a screen recording, so once it has been found
+    # at the same place in the first few frames the box is reused for the remaining frames
+
+    def __init__(self):
+        self.candidates: list[tuple[int, int, int, int]] = []
+        self.locked: tuple[int, int, int, int] = None
+        self.frame_shape = None
+        self.frames_since_validation = 0
+
+    def reset(self):
+        self.candidates = []
+        self.locked = None
+
+    def locate(self, image: MatLike, buffers: dict = None):
+        if self.frame_shape != image.shape:
+            # rotated or resized recording
+            self.frame_shape = image.shape
+            self.reset()
+
+        if self.locked is not None:
+            self.frames_since_validation += 1
+            if self.frames_since_validation < PANEL_REVALIDATE_INTERVAL:
+                return self.locked
+
+            self.frames_since_validation = 0
+            if is_club_header_visible(image, self.locked):
+                return self.locked
+
+            print('club panel moved, locating it again')
+            self.reset()
+
+        info = get_optimization_info(image, buffers)
+
+        if info is None:
+            # fall back to the last known position
+            return self.candidates[-1] if len(self.candidates) else None
+
+        if len(self.candidates) and not is_same_box(info, self.candidates[-1]):
+            self.candidates = []
+
+        self.candidates.append(info)
+        if len(self.candidates) >= PANEL_LOCK_FRAMES:
+            self.locked = info
+            self.frames_since_validation = 0
+
+        return info
+
+def normalize_panel(image: MatLike, info: tuple[int, int, int, int]) -> MatLike:
+    # crop to the club panel, from its header down, and scale it to the canonical width
+    x, y, w, _ = info
+    left = max(x - PANEL_MARGIN, 0)
+    right = min(x + w + PANEL_MARGIN, image.shape[1])
+    panel = crop_image(image, (left, y, right - left, image.shape[0] - y))
+
+    scale = CANONICAL_PANEL_WIDTH / w
+    if abs(scale - 1) < 0.02:
+        return panel
+
+    size = (round(panel.shape[1] * scale), round(panel.shape[0] * scale))
+    return cv2.resize(panel, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+def optimize(image: MatLike, buffers: dict = None, locator: ClubPanelLocator = None):
+    resized_image = resize_image(image, WORKING_HEIGHT)
+    info = locator.locate(resized_image, buffers) if locator is not None else get_optimization_info(resized_image, buffers)
 
     if info is None:
         print('something is wrong')
         return
 
-    return crop_image(resized_image, (
-        max(info[0] - 10, 0),
-        0,
-        min(info[2] + 20, resized_image.shape[1]),
-        resized_image.shape[0],
-    ))
+    return normalize_panel(resized_image, info)
 
-def to_fps(capture: cv2.VideoCapture, fps: int):
-    current_fps = capture.get(cv2.CAP_PROP_FPS)
-    frame_skip = int(current_fps / fps)
-    frame_count = 0
-    while True:
-        ret, frame = capture.read()
-        if not ret:
-            break
-        if frame_count % frame_skip == 0:
-            yield frame
-        frame_count += 1
+def get_thumb_scroll(previous: tuple[float, float], thumb: tuple[float, float], viewport: tuple[int, int, int]) -> float:
+    # the thumb is as long relative to the track as the viewport is relative to the list,
+    # so its movement gives the scroll in pixels, coarse but free of the row aliasing
+    if previous is None or thumb is None or thumb[1] <= thumb[0]:
+        return None
+
+    _, top, bottom = viewport
+    return (thumb[0] - previous[0]) / (thumb[1] - thumb[0]) * (bottom - top)
+
+class SamplingController:
+    # adapts the sampling rate to the scroll speed measured between the processed frames
+
+    def __init__(self, rate: SamplingRate):
+        self.rate = rate
+        self.previous_timestamp = None
+        self.still_since = None
+
+    def update(self, timestamp: float, offset: int, scroll: float, row_height: int):
+        previous_timestamp, self.previous_timestamp = self.previous_timestamp, timestamp
+        if self.rate is None or previous_timestamp is None or timestamp <= previous_timestamp:
+            return
+
+        if offset is None and scroll is None:
+            # the scroll could not be measured, most likely the samples are too far apart
+            self.still_since = None
+            self.rate.set(timestamp, max(self.rate.fps * 1.5, SAMPLING_FPS))
+            return
+
+        # the phase correlation reads nothing when the rows moved by a whole row, the thumb does not
+        displacement = max(abs(offset or 0), abs(scroll or 0))
+        if displacement >= 1:
+            self.still_since = None
+            speed = displacement * 1000 / (timestamp - previous_timestamp)
+            target = max(row_height * ADAPTIVE_TARGET_ROW_OFFSET, 1)
+            # slow scrolls go down to the minimum rate, the speed read on the thumb is coarse so small changes are left alone
+            fps = speed / target
+            if fps > self.rate.fps * 1.25 or fps < self.rate.fps * 0.75:
+                self.rate.set(timestamp, fps)
+            return
+
+        # only frames that were processed and did not move count, skipped frames say nothing about the scroll
+        if self.still_since is None:
+            self.still_since = timestamp
+        elif timestamp - self.still_since >= ADAPTIVE_STILL_MS:
+            self.rate.set(timestamp, self.rate.fps * 0.75)
+
+def get_frame_signature(image: MatLike, viewport: tuple[int, int, int]) -> MatLike:
+    # only the member list matters, the rest of the screen could change without the rows moving
+    if viewport is not None:
+        right, top, bottom = viewport
+        image = image[top:bottom, :right]
+
+    size = (max(image.shape[1] // FRAME_SIGNATURE_DOWNSCALE, 1), max(image.shape[0] // FRAME_SIGNATURE_DOWNSCALE, 1))
+    return to_gray(cv2.resize(image, size, interpolation=cv2.INTER_AREA))
+
+class FrameGate:
+    # skips the frames where the member list looks the same as in the last kept frame
+
+    def __init__(self, threshold: float = FRAME_DIFF_THRESHOLD):
+        self.threshold = threshold
+        self.signature = None
+        self.thumb = None
+
+    def is_similar(self, image: MatLike, viewport: tuple[int, int, int], thumb: tuple[float, float]) -> bool:
+        signature = get_frame_signature(image, viewport)
+
+        # compare against the last kept frame rather than the previous one, so slow scrolling still adds up,
+        # a frame whose scrollbar thumb moved is always kept
+        if self.signature is not None and signature.shape == self.signature.shape and thumb == self.thumb:
+            if cv2.norm(signature, self.signature, cv2.NORM_L1) / signature.size < self.threshold:
+                return True
+
+        self.signature = signature
+        self.thumb = thumb
+        return False
 
 def parse_only_numbers(text: str) -> int:
     ret = 0
@@ -339,18 +707,354 @@ def reconstruct_paths(edges):
 
     return paths
 
-def get_captured_player_info_images(iter):
-    ret = []
+def get_frame_idx(timestamp: float) -> int:
+    # the timestamp in milliseconds, so frames keep the same index across video segments and sampling rates
+    return round(timestamp)
+
+def get_rows_viewport(boxes: list[tuple[int, int, int, int]]):
+    # the area right of the rows, spanning from the first to the last visible row
+    if len(boxes) == 0:
+        return None
+
+    right = max(x + w for x, _, w, _ in boxes)
+    top = min(y for _, y, _, _ in boxes)
+    bottom = max(y + h for _, y, _, h in boxes)
+    return right, top, bottom
+
+def merge_viewports(a: tuple[int, int, int], b: tuple[int, int, int]):
+    if a is None or b is None:
+        return a or b
+
+    return max(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2])
+
+def detect_scrollbar_thumb(image: MatLike, viewport: tuple[int, int, int]):
+    right, top, bottom = viewport
+    strip = image[top:bottom, right:]
+
+    if strip.shape[1] < SCROLLBAR_MIN_STRIP_WIDTH or strip.shape[0] == 0:
+        return None
+
+    # the thumb is the darker run on top of the brighter track
+    profile = cv2.reduce(to_gray(strip), 1, cv2.REDUCE_AVG, dtype=cv2.CV_32F).ravel()
+    track_level = np.percentile(profile, 90)
+    is_thumb = profile < track_level - SCROLLBAR_MIN_CONTRAST
+
+    best_start, best_length, start = 0, 0, None
+    for idx, value in enumerate(np.append(is_thumb, False)):
+        if value and start is None:
+            start = idx
+        elif not value and start is not None:
+            if idx - start > best_length:
+                best_start, best_length = start, idx - start
+            start = None
+
+    if best_length == 0 or best_length == len(profile):
+        return None
+
+    return best_start / len(profile), (best_start + best_length) / len(profile)
+
+def get_row_name_region(image: MatLike, box: tuple[int, int, int, int], margin: int = 0) -> MatLike:
+    x, y, w, h = box
+    region_x, region_y, region_w, region_h = ROW_NAME_REGION
+    left, top = x + int(w * region_x) - margin, y + int(h * region_y) - margin
+    right, bottom = x + int(w * (region_x + region_w)) + margin, y + int(h * (region_y + region_h)) + margin
+    return to_gray(image[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)])
+
+def get_row_name_template(image: MatLike, box: tuple[int, int, int, int]) -> MatLike:
+    # the name region shrunk by the margin, so it could be found again in a slightly shifted box
+    region = get_row_name_region(image, box)
+    if region.shape[0] <= 2 * ROW_TRACK_NAME_MARGIN or region.shape[1] <= 2 * ROW_TRACK_NAME_MARGIN:
+        return None
+    return region[ROW_TRACK_NAME_MARGIN:-ROW_TRACK_NAME_MARGIN, ROW_TRACK_NAME_MARGIN:-ROW_TRACK_NAME_MARGIN].copy()
+
+def is_same_row(template: MatLike, image: MatLike, box: tuple[int, int, int, int]) -> bool:
+    if template is None:
+        return False
+
+    region = get_row_name_region(image, box, ROW_TRACK_NAME_MARGIN)
+    if region.shape[0] < template.shape[0] or region.shape[1] < template.shape[1]:
+        return False
+
+    _, similarity, _, _ = cv2.minMaxLoc(cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED))
+    return similarity >= ROW_TRACK_MIN_SIMILARITY
+
+def is_complete_row(box: tuple[int, int, int, int]) -> bool:
+    # a row cut off at the edge of the list is still found, but its box would follow it once it is
+    # in full view, it is only tracked once it is complete
+    _, _, w, h = box
+    return h > 0 and w / h <= MAX_RATIO
+
+class RowTracker:
+    # follows the member rows across frames and gives every row a stable track id
+
+    def __init__(self):
+        self.tracks: list[tuple[int, tuple[int, int, int, int]]] = []
+        self.templates: dict[int, MatLike] = {}
+        self.next_track_id = 0
+        self.previous_strip = None
+        self.window = None
+        self.viewport = None
+        self.frames_since_detection = 0
+        self.last_offset = None
+        self.last_response = None
+
+    def get_strip(self, image: MatLike):
+        if self.viewport is None:
+            return None
+
+        _, top, bottom = self.viewport
+        start, end = ROW_TRACK_STRIP
+        strip = to_gray(image[top:bottom, int(image.shape[1] * start):int(image.shape[1] * end)])
+        return np.float32(strip)
+
+    def estimate_offset(self, strip):
+        self.last_response = None
+        if strip is None or self.previous_strip is None or strip.shape != self.previous_strip.shape or strip.size == 0:
+            return None
+
+        if self.window is None or self.window.shape != strip.shape:
+            self.window = cv2.createHanningWindow((strip.shape[1], strip.shape[0]), cv2.CV_32F)
+
+        (_, dy), response = cv2.phaseCorrelate(self.previous_strip, strip, self.window)
+        self.last_response = response
+        if response < ROW_TRACK_MIN_RESPONSE:
+            return None
+
+        return int(round(dy))
+
+    def predict(self, image: MatLike, offset: int):
+        # the rows still fully in view keep their tracks at their shifted position
+        _, top, bottom = self.viewport
+        predicted = [(track_id, (x, y + offset, w, h)) for track_id, (x, y, w, h) in self.tracks]
+        visible = [(track_id, box) for track_id, box in predicted if box[1] >= top and box[1] + box[3] <= bottom]
+
+        if len(visible) == 0:
+            return None
+
+        # the offset is rounded every frame, the edges are searched again so the boxes do not drift
+        visible = [(track_id, refine_row_box(image, box)) for track_id, box in visible]
+
+        # the phase correlation could read a whole row of scroll as none, the rows must still show the same names
+        if not all(is_same_row(self.templates.get(track_id), image, box) for track_id, box in visible):
+            return None
+
+        return visible
+
+    def get_new_row_bands(self, image: MatLike, visible: list[tuple[int, tuple[int, int, int, int]]]) -> list[tuple[int, int]]:
+        # new rows could only have scrolled in above the first or below the last tracked row, the viewport
+        # only grows as rows are seen, so the bands reach a row past its edges
+        _, top, bottom = self.viewport
+        row_height = min(box[3] for _, box in visible)
+        first_top = min(box[1] for _, box in visible)
+        last_bottom = max(box[1] + box[3] for _, box in visible)
+
+        bands = [
+            (max(top - row_height, 0), first_top + ROW_REFINE_MARGIN),
+            (last_bottom - ROW_REFINE_MARGIN, min(bottom + row_height, image.shape[0])),
+        ]
+        # a band shorter than a row could only hold a row cut off at the edge of the list
+        return [(band_top, band_bottom) for band_top, band_bottom in bands if band_bottom - band_top - ROW_REFINE_MARGIN >= row_height]
+
+    def assign(self, image: MatLike, boxes: list[tuple[int, int, int, int]], offset: int):
+        tracks = []
+        # without an offset the rows could have moved anywhere, they all start new tracks
+        previous = [(track_id, y + offset) for track_id, (_, y, _, _) in self.tracks] if offset is not None else []
+
+        for box in sorted(boxes, key=lambda box: box[1]):
+            matches = [
+                track_id for track_id, y in previous
+                if abs(y - box[1]) <= ROW_TRACK_MATCH_TOLERANCE and is_same_row(self.templates.get(track_id), image, box)
+            ]
+            if len(matches):
+                track_id = matches[0]
+                previous = [e for e in previous if e[0] != track_id]
+            else:
+                track_id = self.next_track_id
+                self.next_track_id += 1
+            tracks.append((track_id, box))
+
+        return tracks
+
+    def update(self, image: MatLike, detect, stats: dict = None) -> list[tuple[int, tuple[int, int, int, int]]]:
+        strip = self.get_strip(image)
+        offset = self.estimate_offset(strip)
+        self.last_offset = offset
+
+        tracks = None
+        if offset is not None and self.frames_since_detection < ROW_TRACK_FULL_DETECTION_INTERVAL:
+            tracks = self.predict(image, offset)
+
+        if tracks is None:
+            # the offset is unreliable, the whole frame is searched
+            boxes = detect(image)
+            tracks = self.assign(image, [box for box in boxes if is_complete_row(box)], offset)
+            self.frames_since_detection = 0
+
+            if stats is not None:
+                stats["row_detections_full"] = stats.get("row_detections_full", 0) + 1
+        else:
+            # only the bands where a new row could have appeared are searched
+            bands = self.get_new_row_bands(image, tracks)
+            boxes = [(x, y + band_top, w, h) for band_top, band_bottom in bands for x, y, w, h in detect(image[band_top:band_bottom])]
+            tracks = sorted(tracks + self.assign(image, [box for box in boxes if is_complete_row(box)], offset), key=lambda track: track[1][1])
+            self.frames_since_detection += 1
+
+            if stats is not None:
+                stats["row_detections_tracked"] = stats.get("row_detections_tracked", 0) + 1
+                stats["row_detections_band"] = stats.get("row_detections_band", 0) + len(bands)
+
+        # the list area does not change, it only looks smaller when a row is cut off at its edges
+        viewport = merge_viewports(self.viewport, get_rows_viewport(boxes))
+        if viewport != self.viewport:
+            self.viewport = viewport
+            strip = self.get_strip(image)
+
+        self.tracks = tracks
+        self.templates = {track_id: get_row_name_template(image, box) for track_id, box in tracks}
+        self.previous_strip = strip
+        return tracks
+
+def relabel_names_by_track_inplace(records: dict[str, list[dict[str, int]]]):
+    # the same row could be read as slightly different names across frames, trust the track instead
+    names_by_track: dict[int, Counter] = {}
+    for name, record_by_frame in records.items():
+        for record in record_by_frame:
+            if record.get("track_id") is not None:
+                names_by_track.setdefault(record["track_id"], Counter())[name] += 1
+
+    name_by_track = {track_id: counter.most_common(1)[0][0] for track_id, counter in names_by_track.items()}
+
+    for name in list(records.keys()):
+        kept = []
+        for record in records[name]:
+            target = name_by_track.get(record.get("track_id"), name)
+            # a name far from the majority is another member that ended up on the track, not a misread
+            if target == name or SequenceMatcher(None, name, target).ratio() < RELABEL_MIN_NAME_SIMILARITY:
+                kept.append(record)
+            else:
+                records[target].append(record)
+
+        if len(kept):
+            records[name] = kept
+        else:
+            del records[name]
+
+class ScrollCoverage:
+    # tracks which part of the member list has been read by how many frames
+
+    def __init__(self, buckets: int = COVERAGE_BUCKETS, min_reads: int = COVERAGE_MIN_READS):
+        self.reads = np.zeros(buckets, dtype=np.int32)
+        self.min_reads = min_reads
+        # whether the list was seen resting at its top and at its bottom
+        self.rested = [False, False]
+
+    def to_buckets(self, thumb: tuple[float, float]) -> slice:
+        start, end = thumb
+        return slice(int(start * len(self.reads)), max(int(np.ceil(end * len(self.reads))), int(start * len(self.reads)) + 1))
+
+    def is_covered(self, thumb: tuple[float, float]) -> bool:
+        # the viewport is measured on the rows, so near the ends of the list the thumb could be
+        # cut off and look like a part already read, the first and last rows are always read
+        start, end = thumb
+        if start <= 0 or end >= 1:
+            return False
+
+        return bool(np.all(self.reads[self.to_buckets(thumb)] >= self.min_reads))
+
+    def add(self, thumb: tuple[float, float], still: bool = False):
+        buckets = self.to_buckets(thumb)
+        self.reads[buckets] += 1
+
+        # the rows at the ends of the list are read in every frame showing them, once the list rests
+        # at an end they do not have to be scrolled past three times. a moving thumb could only look
+        # like it reached the end because the viewport has not grown to the whole list yet
+        start, end = thumb
+        if still and (start <= 0 or end >= 1):
+            self.reads[buckets] = np.maximum(self.reads[buckets], self.min_reads)
+            self.rested[0] |= start <= 0
+            self.rested[1] |= end >= 1
+
+    def ratio(self) -> float:
+        return float(np.count_nonzero(self.reads >= self.min_reads)) / len(self.reads)
+
+    def is_complete(self) -> bool:
+        # the thumb of a moving list could look like it reached an end while a row is still to come,
+        # the roster is only complete once the list rested at both ends
+        return all(self.rested) and bool(np.all(self.reads >= self.min_reads))
+
+def add_coverage(coverage: ScrollCoverage, thumb: tuple[float, float], timestamp: float, stats: dict, still: bool = False) -> bool:
+    coverage.add(thumb, still)
+    stats["scroll_coverage"] = coverage.ratio()
+
+    if coverage.is_complete():
+        # the whole list has been read often enough, the rest of the recording is not needed
+        stats["stopped_at_ms"] = timestamp
+        return True
+    return False
+
+def get_captured_player_info_images(iter, stats: dict = None, rate: SamplingRate = None):
+    if stats is None:
+        stats = {}
+
+    # mask buffers, the panel position and the viewport are reused across the frames of this video
+    buffers = {}
+    locator = ClubPanelLocator()
+    coverage = ScrollCoverage()
+    tracker = RowTracker()
+    controller = SamplingController(rate)
+    gate = FrameGate()
+    previous_thumb = None
+    stats.setdefault("frames_sampled", 0)
+    stats.setdefault("frames_skipped", 0)
+
+    for timestamp, frame in iter:
+        frame_idx = get_frame_idx(timestamp)
+        stats["frames_sampled"] += 1
+        start = time.perf_counter()
+        optimized_frame = optimize(frame, buffers, locator)
+        add_stage_time(stats, "optimize", start)
+
+        if optimized_frame is None:
+            stats["frames_without_panel"] = stats.get("frames_without_panel", 0) + 1
+            continue
+
+        start = time.perf_counter()
+        thumb = detect_scrollbar_thumb(optimized_frame, tracker.viewport) if tracker.viewport is not None else None
+        if gate.is_similar(optimized_frame, tracker.viewport, thumb):
+            stats["frames_skipped"] += 1
+            add_stage_time(stats, "detect", start)
+
+            # the list did not move, the frame still shows the rows just read, so a recording
+            # that rests at the bottom of the list stops there
+            if thumb is not None and add_coverage(coverage, thumb, timestamp, stats, still=True):
+                break
+            continue
+
+        if thumb is not None and coverage.is_covered(thumb):
+            stats["frames_already_covered"] = stats.get("frames_already_covered", 0) + 1
+            add_stage_time(stats, "detect", start)
+            continue
+
+        tracks = tracker.update(optimized_frame, lambda image: detect_player_rows(image, buffers), stats)
+        add_stage_time(stats, "detect", start)
+        stats["rows_detected"] = stats.get("rows_detected", 0) + len(tracks)
 
-    for frame_idx, frame in enumerate(iter):
-        optimized_frame = optimize(frame)
-        boxes = detect_player_rows(optimized_frame)
-        for box in boxes:
-            image = crop_image(optimized_frame, box)
+        if len(tracks):
+            scroll = get_thumb_scroll(previous_thumb, thumb, tracker.viewport)
+            controller.update(timestamp, tracker.last_offset, scroll, min(box[3] for _, box in tracks))
+        previous_thumb = thumb
+
+        if thumb is not None:
+            add_coverage(coverage, thumb, timestamp, stats)
+
+        for track_id, box in tracks:
+            # copy the crop so the frame can be freed as soon as its rows are detected
+            image = crop_image(optimized_frame, box).copy()
             _, y, _, _ = box
-            ret.append((image, frame_idx, y))
+            yield image, frame_idx, y, track_id
 
-    return ret
+        if "stopped_at_ms" in stats:
+            break
 
 def extract_from_ocr_results(texts: list[str]) -> tuple[bool, tuple[str, str, int, int]]:
     normalized_texts = [' '.join(e.lower().strip().split(' ')) for e in texts]
@@ -378,83 +1082,420 @@ def vote_by_majority(records: dict[str, list[dict[str, int]]]):
         ret[name] = (role_counter.most_common(1)[0][0], total_fans_counter.most_common(1)[0][0], last_login_counter.most_common(1)[0][0])
     return ret
 
+def index_observations_by_frame(records: dict[str, list[dict[str, int]]]) -> dict[int, list[tuple[int, str]]]:
+    frames: dict[int, list[tuple[int, str]]] = {}
+    for name, record_by_frame in records.items():
+        for record in record_by_frame:
+            frames.setdefault(record["frame_idx"], []).append((record["frame_box_y"], name))
+    return frames
+
+def find_root(parents: dict[str, str], name: str) -> str:
+    while parents.get(name, name) != name:
+        parents[name] = parents.get(parents[name], parents[name])
+        name = parents[name]
+    return name
+
 def get_order_relationship(records: dict[str, list[dict[str, int]]]):
+    # every frame votes for the rows that are right next to each other
+    votes = Counter()
+    for rows in index_observations_by_frame(records).values():
+        rows.sort()
+        for (_, upper), (_, lower) in zip(rows, rows[1:]):
+            if upper != lower:
+                votes[(upper, lower)] += 1
+
+    # keep the most voted successor of every name without creating branches or cycles,
+    # a frame missing a row would otherwise link its neighbours to each other
     ret = set()
+    has_successor = set()
+    has_predecessor = set()
+    parents: dict[str, str] = {}
 
-    for k1, first in records.items():
-        for k2, second in records.items():
-            if k1 == k2:
-                break
+    for (upper, lower), _ in votes.most_common():
+        if upper in has_successor or lower in has_predecessor:
+            continue
 
-            if (k1, k2) in ret or (k2, k1) in ret:
-                break
+        upper_root, lower_root = find_root(parents, upper), find_root(parents, lower)
+        if upper_root == lower_root:
+            continue
+
+        parents[lower_root] = upper_root
+        has_successor.add(upper)
+        has_predecessor.add(lower)
+        ret.add((upper, lower))
 
-            for first_frame in first:
-                for second_frame in second:
-                    if first_frame["frame_idx"] == second_frame["frame_idx"]:
-                        if first_frame["frame_box_y"] < second_frame["frame_box_y"]:
-                            ret.add((k1, k2))
-                        else:
-                            ret.add((k2, k1))
-                        break
-                else:
-                    continue
-                break
     return ret
 
 def merge_group_with_same_groundtruth_inplace(records: dict[str, list[dict[str, int]]], groundtruths: dict[str, tuple[str, int, int]]):
+    names_by_groundtruth: dict[tuple[str, int, int], list[str]] = {}
     for name, groundtruth in groundtruths.items():
-        if name not in records:
+        if name in records:
+            names_by_groundtruth.setdefault(groundtruth, []).append(name)
+
+    for names in names_by_groundtruth.values():
+        if len(names) < 2:
             continue
 
-        for name2, groundtruth2 in groundtruths.items():
-            if name2 not in records:
-                continue
-            if name == name2:
-                continue
-
-            if groundtruth == groundtruth2:
-                # get the lens
-                if len(records[name]) > len(records[name2]):
-                    records[name].extend(records[name2])
-                    del records[name2]
-                else:
-                    records[name2].extend(records[name])
-                    del records[name]
-
-def extract_player_info(images):
-    ret: dict[str, list[dict[str, int]]] = {}
+        # keep the name with the most records
+        target = max(names, key=lambda name: len(records[name]))
+        for name in names:
+            if name != target:
+                records[target].extend(records.pop(name))
+
+def batched(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+class ConsensusTracker:
+    # collects the parsed reads per row track until enough of them agree
+
+    def __init__(self, required_reads: int = CONSENSUS_READS):
+        self.required_reads = required_reads
+        self.reads: dict[int, Counter] = {}
+        # the settled read with the name region of the row it was settled on
+        self.settled: dict[int, tuple[tuple[str, str, int, int], MatLike]] = {}
+
+    def get_settled(self, track_id: int, image: MatLike) -> tuple[str, str, int, int]:
+        if track_id is None or self.required_reads <= 0 or track_id not in self.settled:
+            return None
+
+        # the track could have moved to another member, the read is only reused on the same row
+        data, template = self.settled[track_id]
+        return data if is_same_row(template, image, (0, 0, image.shape[1], image.shape[0])) else None
+
+    def add(self, track_id: int, data: tuple[str, str, int, int], image: MatLike):
+        if track_id is None or self.required_reads <= 0 or track_id in self.settled or data is None:
+            return
+
+        counter = self.reads.setdefault(track_id, Counter())
+        counter[data] += 1
+        if counter[data] >= self.required_reads:
+            self.settled[track_id] = (data, get_row_name_template(image, (0, 0, image.shape[1], image.shape[0])))
+            del self.reads[track_id]
+
+def normalize_read(data: tuple[str, str, int, int]):
+    if data is None:
+        return None
 
-    for image, frame_idx, y in images:
-        texts = ocr_image(image)
-        success, data = extract_from_ocr_results(texts)
-        if not success:
-            continue
+    role, name, total_fans, last_login = data
+    return role.lower().strip(), ' '.join(name.split()), total_fans, last_login
+
+def check_field_reads(images: list[MatLike], reads: list[tuple[str, str, int, int]], stats: dict = None):
+    # returns the reads of the full ocr when the field reads disagree with them, None otherwise
+    reference = read_player_rows(images, stats, "full")
+    compared = [(read, expected) for read, expected in zip(reads, reference) if expected is not None]
+
+    if any(normalize_read(read) != normalize_read(expected) for read, expected in compared):
+        return reference, len(compared)
+    return None, len(compared)
 
-        role, name, total_fans, last_login = data
+def recognize_player_rows(images, stats: dict = None, batch_size: int = OCR_BATCH_SIZE, consensus_reads: int = CONSENSUS_READS, ocr_mode: str = "full"):
+    consensus = ConsensusTracker(consensus_reads)
+    rows_checked = 0
 
-        if name not in ret:
-            ret[name] = []
+    for batch in batched(images, batch_size):
+        # settled rows only contribute their position, their reads are reused
+        settled = [consensus.get_settled(track_id, image) for image, _, _, track_id in batch]
+        pending = [item for item, data in zip(batch, settled) if data is None]
+        pending_images = [image for image, *_ in pending]
+        reads = read_player_rows(pending_images, stats, ocr_mode)
+
+        if ocr_mode == "fields" and rows_checked < FIELDS_CHECK_ROWS and len(pending_images):
+            reference, compared = check_field_reads(pending_images, reads, stats)
+            rows_checked += compared
+
+            if reference is not None:
+                print("club video: the field reads disagree with the full ocr, reading the rest of the video with the full ocr")
+                if stats is not None:
+                    stats["ocr_fields_rejected"] = True
+                ocr_mode = "full"
+                reads = reference
+
+        data_by_image = iter(reads)
+
+        if stats is not None:
+            stats["ocr_skipped_settled"] = stats.get("ocr_skipped_settled", 0) + len(batch) - len(pending)
+
+        for (image, frame_idx, y, track_id), data in zip(batch, settled):
+            if data is None:
+                data = next(data_by_image)
+                consensus.add(track_id, data, image)
+            yield data, frame_idx, y, track_id
+
+def extract_player_info(images, stats: dict = None, batch_size: int = OCR_BATCH_SIZE, consensus_reads: int = CONSENSUS_READS, ocr_mode: str = "full"):
+    ret: dict[str, list[dict[str, int]]] = {}
+
+    for data, frame_idx, y, track_id in recognize_player_rows(images, stats, batch_size, consensus_reads, ocr_mode):
+        add_player_observation(ret, data, frame_idx, y, track_id)
 
-        ret[name].append({
-            "role": role,
-            "total_fans": total_fans,
-            "last_login": last_login,
-            "frame_idx": frame_idx,
-            "frame_box_y": y,
-        })
     return ret
 
-def extract_video(path: str):
-    cap = cv2.VideoCapture(path)
+def add_player_observation(ret: dict[str, list[dict[str, int]]], data: tuple[str, str, int, int], frame_idx: int, y: int, track_id: int = None):
+    if data is None:
+        return
+
+    role, name, total_fans, last_login = data
+
+    if name not in ret:
+        ret[name] = []
+
+    record = {
+        "role": role,
+        "total_fans": total_fans,
+        "last_login": last_login,
+        "frame_idx": frame_idx,
+        "frame_box_y": y,
+        "track_id": track_id,
+    }
+    ret[name].append(record)
+    return record
+
+def load_checkpoint(checkpoint: Checkpoint, entry_type: str) -> tuple[list[dict], int]:
+    # returns the entries written by the previous runs of the job and the number of the current run
+    entries = checkpoint.load()
+
+    if any(entry["type"] != entry_type for entry in entries):
+        # written with another number of workers, the work done so far can not be reused
+        checkpoint.remove()
+        return [], 0
+
+    return entries, max((entry["run"] for entry in entries), default=-1) + 1
+
+def restore_frame_checkpoint(ret: dict[str, list[dict[str, int]]], entries: list[dict]):
+    for entry in entries:
+        for name, record in entry["observations"]:
+            # every run numbers its tracks from zero
+            if record["track_id"] is not None:
+                record["track_id"] = (entry["run"], record["track_id"])
+            ret.setdefault(name, []).append(record)
+
+def collect_player_observations(
+    path: str,
+    options: dict,
+    stats: dict,
+    start_ms: float = 0,
+    end_ms: float = None,
+    progress: ProgressReporter = None,
+    checkpoint: Checkpoint = None,
+):
+    player_data_group_by_name: dict[str, list[dict[str, int]]] = {}
+    run = 0
+
+    if checkpoint is not None:
+        entries, run = load_checkpoint(checkpoint, "frame")
+        restore_frame_checkpoint(player_data_group_by_name, entries)
+
+        # frames are only written once all of their rows are read, the job resumes right after the last one
+        if len(entries):
+            start_ms = max(start_ms, entries[-1]["frame_idx"] + 1)
+            stats["resumed_from_ms"] = start_ms
+
+    rate = SamplingRate(SAMPLING_FPS, ADAPTIVE_MIN_FPS, ADAPTIVE_MAX_FPS) if options["adaptive_sampling"] else SamplingRate(SAMPLING_FPS)
+    frames = time_stage(sample_frames(path, rate, options["backend"], get_resized_size, start_ms, end_ms), stats, "decode")
+    frames = report_progress(frames, progress)
+
+    # decode -> detect -> ocr run on their own threads, the observations are aggregated here
+    rows = run_pipeline(frames, [
+        lambda frames: get_captured_player_info_images(frames, stats, rate),
+        lambda images: recognize_player_rows(images, stats, options["ocr_batch_size"], options["consensus_reads"], options["ocr_mode"]),
+    ], PIPELINE_QUEUE_SIZE)
+
+    # the rows arrive in frame order, a frame is complete once a row of the next frame arrives
+    frame = None
+    for data, frame_idx, y, track_id in rows:
+        start = time.perf_counter()
+        if checkpoint is not None and (frame is None or frame["frame_idx"] != frame_idx):
+            if frame is not None and len(frame["observations"]):
+                checkpoint.append(frame)
+            frame = {"type": "frame", "run": run, "frame_idx": frame_idx, "observations": []}
+
+        record = add_player_observation(player_data_group_by_name, data, frame_idx, y, track_id)
+        if checkpoint is not None and record is not None:
+            frame["observations"].append((data[1], dict(record)))
+        add_stage_time(stats, "aggregate", start)
+
+    if frame is not None and len(frame["observations"]):
+        checkpoint.append(frame)
+
+    stats["fps_timeline"] = [(start_ms, SAMPLING_FPS)] + rate.timeline[1:]
+    return player_data_group_by_name
+
+def init_segment_worker():
+    if not is_paddleocr_initialized():
+        init_paddleocr()
+
+def extract_video_segment(path: str, options: dict, start_ms: float, end_ms: float):
+    stats = {}
+    return collect_player_observations(path, options, stats, start_ms, end_ms), stats
+
+def plan_segments(duration_ms: float, count: int, overlap_ms: float = SEGMENT_OVERLAP_MS) -> list[tuple[float, float]]:
+    length = duration_ms / count
+    return [
+        (max(i * length - overlap_ms, 0), duration_ms if i == count - 1 else (i + 1) * length)
+        for i in range(count)
+    ]
+
+def merge_segment_observations(segments: list[dict[str, list[dict[str, int]]]]):
+    ret: dict[str, list[dict[str, int]]] = {}
+    seen = set()
+
+    for segment_idx, records in enumerate(segments):
+        for name, record_by_frame in records.items():
+            for record in record_by_frame:
+                # the overlapping frames are processed by two workers
+                key = (name, record["frame_idx"], record["frame_box_y"])
+                if key in seen:
+                    continue
+                seen.add(key)
 
-    images = get_captured_player_info_images(to_fps(cap, 12))
-    player_data_group_by_name = extract_player_info(images)
+                # track ids are only unique within a segment
+                if record.get("track_id") is not None:
+                    record["track_id"] = (segment_idx, record["track_id"])
+                ret.setdefault(name, []).append(record)
+
+    return ret
+
+def merge_segment_stats(stats: dict, segment_stats: dict):
+    for key, value in segment_stats.items():
+        if isinstance(value, int) and not isinstance(value, bool):
+            # counters add up across segments
+            stats[key] = stats.get(key, 0) + value
+        elif isinstance(value, float):
+            # ratios and timestamps keep the furthest segment
+            stats[key] = max(stats.get(key, value), value)
+        elif isinstance(value, list):
+            stats[key] = sorted(stats.get(key, []) + value)
+        elif isinstance(value, dict):
+            # stage timings add up, the segments ran at the same time so the sum is cpu time rather than wall time
+            merged = stats.setdefault(key, {})
+            for name, seconds in value.items():
+                merged[name] = merged.get(name, 0) + seconds
+        else:
+            stats[key] = value
+
+_segment_pool: ProcessPoolExecutor = None
+_segment_pool_workers = 0
+
+def get_segment_pool(workers: int) -> ProcessPoolExecutor:
+    global _segment_pool, _segment_pool_workers
+
+    # keep the pool alive between jobs, every worker loads its own ocr model once
+    if _segment_pool is None or _segment_pool_workers != workers:
+        if _segment_pool is not None:
+            _segment_pool.shutdown()
+        _segment_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_segment_worker,
+        )
+        _segment_pool_workers = workers
+
+    return _segment_pool
+
+def restore_segment_stats(segment_stats: dict) -> dict:
+    # json turns the tuples of the lists into lists, which do not sort together with tuples
+    return {
+        key: [tuple(e) if isinstance(e, list) else e for e in value] if isinstance(value, list) else value
+        for key, value in segment_stats.items()
+    }
+
+def collect_player_observations_parallel(
+    path: str,
+    options: dict,
+    stats: dict,
+    workers: int,
+    progress: ProgressReporter = None,
+    checkpoint: Checkpoint = None,
+):
+    duration_ms = get_video_info(path)["duration_ms"]
+    if duration_ms <= 0:
+        # the container does not report its length, nothing to split on
+        return collect_player_observations(path, options, stats, progress=progress, checkpoint=checkpoint)
+
+    # finished segments are written as a whole, a resumed job only runs the missing ones
+    entries, run = load_checkpoint(checkpoint, "segment") if checkpoint is not None else ([], 0)
+    finished = {tuple(entry["plan"]): entry for entry in entries}
+    plan = plan_segments(duration_ms, workers)
+    if any(segment in finished for segment in plan):
+        stats["resumed_segments"] = sum(segment in finished for segment in plan)
+
+    pool = get_segment_pool(workers)
+
+    futures = {
+        segment: pool.submit(extract_video_segment, path, options, *segment)
+        for segment in plan if segment not in finished
+    }
+
+    segments = []
+    for segment in plan:
+        if segment in finished:
+            records, segment_stats = finished[segment]["records"], restore_segment_stats(finished[segment]["stats"])
+        else:
+            records, segment_stats = futures[segment].result()
+            if checkpoint is not None:
+                checkpoint.append({"type": "segment", "run": run, "plan": segment, "records": records, "stats": segment_stats})
+
+        segments.append(records)
+        merge_segment_stats(stats, segment_stats)
+
+        # the workers can not report back while they run, the progress moves one segment at a time
+        if progress is not None:
+            progress.report("processing", duration_ms * len(segments) / len(plan), force=True)
+
+    return merge_segment_observations(segments)
+
+def extract_video(
+    path: str,
+    backend: str = "opencv",
+    stats: dict = None,
+    ocr_batch_size: int = OCR_BATCH_SIZE,
+    workers: int = 1,
+    consensus_reads: int = CONSENSUS_READS,
+    adaptive_sampling: bool = False,
+    ocr_mode: str = "full",
+    on_progress: typing.Callable[[dict], None] = None,
+    checkpoint: str = None,
+):
+    if stats is None:
+        stats = {}
+
+    # observations are written to the checkpoint as they are read, so the job could be resumed
+    checkpoint = Checkpoint(checkpoint) if checkpoint is not None else None
+
+    info = get_video_info(path)
+    stats["video_duration_ms"] = info["duration_ms"]
+    progress = ProgressReporter(on_progress, stats, info)
+    progress.report("processing", 0, force=True)
+
+    options = {
+        "backend": backend,
+        "ocr_batch_size": ocr_batch_size,
+        "consensus_reads": consensus_reads,
+        "adaptive_sampling": adaptive_sampling,
+        "ocr_mode": ocr_mode,
+    }
+
+    if workers > 1:
+        player_data_group_by_name = collect_player_observations_parallel(path, options, stats, workers, progress, checkpoint)
+    else:
+        player_data_group_by_name = collect_player_observations(path, options, stats, progress=progress, checkpoint=checkpoint)
+
+    progress.report("aggregating", force=True)
+    start = time.perf_counter()
+    relabel_names_by_track_inplace(player_data_group_by_name)
     groundtruth_by_group = vote_by_majority(player_data_group_by_name)
     merge_group_with_same_groundtruth_inplace(player_data_group_by_name, groundtruth_by_group)
     order_relationship = get_order_relationship(player_data_group_by_name)
     reconstructed_paths = reconstruct_paths(order_relationship)
-    cap.release()
+    add_stage_time(stats, "aggregate", start)
+
+    print(f"club video: sampled {stats['frames_sampled']} frames, skipped {stats['frames_skipped']} near-duplicate frames")
+    print(f"club video: sampling rate timeline {', '.join(f'{timestamp / 1000:.1f}s@{fps:.0f}fps' for timestamp, fps in stats['fps_timeline'])}")
+    print(f"club video: ocr cache {stats.get('ocr_cache_hits', 0)} hits, {stats.get('ocr_cache_misses', 0)} misses (lifetime hit ratio {ocr_cache.hit_ratio():.0%}, {len(ocr_cache)} entries)")
+    print(f"club video: stage seconds {', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in stats.get('stage_seconds', {}).items())}")
+
+    progress.report("done", info["duration_ms"], force=True)
 
     if len(reconstructed_paths) == 0:
       raise Exception("No reconstructed paths found.")
@@ -3,21 +3,25 @@ from cv2.typing import MatLike
 from paddleocr import PaddleOCR
 import numpy as np
 import re
-from utils.opencv import create_binary_mask, remove_noise, find_white_regions, crop_image, ocr
+from utils.opencv import create_color_mask, remove_noise, find_white_regions, crop_image, get_ocr, ocr_lock, image_fingerprint
+
+# bump whenever a change alters the extracted results, cached results of older versions are ignored
+PIPELINE_VERSION = "1"
 
 CLUB_HEADER_COLOR = "#7fcc0b"
-TEMPLATE_DOUBLE_CIRCLE = cv2.imread("opencv/assets/double-circle.png")
-TEMPLATE_DOUBLE_CIRCLE2 = cv2.imread("opencv/assets/double-circle2.png")
-TEMPLATE_DOUBLE_CIRCLE3 = cv2.imread("opencv/assets/double-circle3.png")
-TEMPLATE_CIRCLE = cv2.imread("opencv/assets/circle.png")
-TEMPLATE_CIRCLE2 = cv2.imread("opencv/assets/circle2.png")
-TEMPLATE_CIRCLE3 = cv2.imread("opencv/assets/circle3.png")
+# the templates are edge images, so they are matched against the single channel canny output
+TEMPLATE_DOUBLE_CIRCLE = cv2.imread("opencv/assets/double-circle.png", cv2.IMREAD_GRAYSCALE)
+TEMPLATE_DOUBLE_CIRCLE2 = cv2.imread("opencv/assets/double-circle2.png", cv2.IMREAD_GRAYSCALE)
+TEMPLATE_DOUBLE_CIRCLE3 = cv2.imread("opencv/assets/double-circle3.png", cv2.IMREAD_GRAYSCALE)
+TEMPLATE_CIRCLE = cv2.imread("opencv/assets/circle.png", cv2.IMREAD_GRAYSCALE)
+TEMPLATE_CIRCLE2 = cv2.imread("opencv/assets/circle2.png", cv2.IMREAD_GRAYSCALE)
+TEMPLATE_CIRCLE3 = cv2.imread("opencv/assets/circle3.png", cv2.IMREAD_GRAYSCALE)
 
 CIRCLE_TEMPLATES = [TEMPLATE_CIRCLE, TEMPLATE_CIRCLE2, TEMPLATE_CIRCLE3]
 DOUBLE_CIRCLE_TEMPLATES = [TEMPLATE_DOUBLE_CIRCLE, TEMPLATE_DOUBLE_CIRCLE2, TEMPLATE_DOUBLE_CIRCLE3]
 
 def find_club_header(image: MatLike):
-    step1 = create_binary_mask(image, [CLUB_HEADER_COLOR], 60)
+    step1 = create_color_mask(image, [CLUB_HEADER_COLOR], 60)
     step2 = remove_noise(step1, 4000)
 
     boxes = find_white_regions(
@@ -53,34 +57,44 @@ white_skill_color = "#bfbfff"
 gold_skill_color = "#ffbf3f"
 skill_section_coordinates = (5, 440, 542, 409)
 
+MARKER_THRESHOLD = 0.5
+MARKER_TEMPLATE_SIZE = max(max(template.shape) for template in CIRCLE_TEMPLATES + DOUBLE_CIRCLE_TEMPLATES)
+
+def match_marker(edges: MatLike, templates: list[MatLike]):
+    # only whether a marker is there matters, so the first template above the threshold is enough
+    for template in templates:
+        if template.shape[0] > edges.shape[0] or template.shape[1] > edges.shape[1]:
+            continue
+
+        res = cv2.matchTemplate(edges, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if max_val >= MARKER_THRESHOLD:
+            return max_loc
+
+    return None
+
 def find_circle(image: MatLike):
-    whatever = cv2.Canny(image, 50, 150)
-    whatever = cv2.cvtColor(whatever, cv2.COLOR_GRAY2BGR)
-    threshold = 0.5
-
-    max_threshold = 0
-    max_circle = None
-
-    for template in CIRCLE_TEMPLATES:
-        res = cv2.matchTemplate(whatever, template, cv2.TM_CCOEFF_NORMED)
-        loc = np.where(res >= threshold)
-        for pt in zip(*loc[::-1]):
-            if res[pt[1], pt[0]] > max_threshold:
-                max_threshold = res[pt[1], pt[0]]
-                max_circle = pt
-
-    max_threshold = 0
-    max_double_circle = None
-
-    for template in DOUBLE_CIRCLE_TEMPLATES:
-        res = cv2.matchTemplate(whatever, template, cv2.TM_CCOEFF_NORMED)
-        loc = np.where(res >= threshold)
-        for pt in zip(*loc[::-1]):
-            if res[pt[1], pt[0]] > max_threshold:
-                max_threshold = res[pt[1], pt[0]]
-                max_double_circle = pt
-
-    return max_circle, max_double_circle
+    edges = cv2.Canny(image, 50, 150)
+
+    # a window without any edge can not match a template, so only the area around the edges is searched
+    x, y, w, h = cv2.boundingRect(edges)
+    if w == 0:
+        return None, None
+
+    x0 = max(x - MARKER_TEMPLATE_SIZE, 0)
+    y0 = max(y - MARKER_TEMPLATE_SIZE, 0)
+    edges = edges[y0:y + h + MARKER_TEMPLATE_SIZE, x0:x + w + MARKER_TEMPLATE_SIZE]
+
+    # a double circle also matches the circle templates, so it is looked for first
+    double_circle = match_marker(edges, DOUBLE_CIRCLE_TEMPLATES)
+    if double_circle is not None:
+        return None, (double_circle[0] + x0, double_circle[1] + y0)
+
+    circle = match_marker(edges, CIRCLE_TEMPLATES)
+    if circle is not None:
+        return (circle[0] + x0, circle[1] + y0), None
+
+    return None, None
 
 # rgb format
 S_COLOR = (88,170,205) # ok
@@ -125,17 +139,18 @@ def remove_level_from_skill_name(skill_name: str):
 
     return False, skill_name
 
-def parse_skill(image: MatLike, box: tuple[int, int, int, int]):
+def get_skill_box(box: tuple[int, int, int, int]):
+    # skill row box to the box of the skill name and marker on the card
     skill_icon_width = int(box[2] * 0.15)
 
-    crop = crop_image(image, (
+    return (
         box[0] + skill_icon_width,
         box[1] + skill_section_coordinates[1],
         box[2] - skill_icon_width,
         box[3],
-    ))
+    )
 
-    texts = ocr.predict(crop)[0]["rec_texts"]
+def parse_skill(crop: MatLike, texts: list[str]):
     skill_name = ' '.join(texts).strip()
     is_unique_skill, skill_name = remove_level_from_skill_name(skill_name)
 
@@ -149,7 +164,7 @@ def parse_skill(image: MatLike, box: tuple[int, int, int, int]):
     
     return is_unique_skill, skill_name
 
-def parse_skill_section(image: MatLike):
+def get_skill_boxes(image: MatLike):
     p = posterization(image, 10)
 
     skill_section = crop_image(p, skill_section_coordinates)
@@ -164,14 +179,21 @@ def parse_skill_section(image: MatLike):
     contours, _ = cv2.findContours(floodfilled, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     boxes = [cv2.boundingRect(contour) for contour in contours]
 
+    return [get_skill_box(box) for box in boxes if box[2] / box[3] >= 5]
+
+# small enough to absorb resampling noise between screenshots, large enough to tell ○ from ◎
+SKILL_FINGERPRINT_SIZE = (112, 20)
+SKILL_FINGERPRINT_LEVELS = 8
+
+def get_skill_key(crop: MatLike, ocr_mode: str):
+    # the modes read a row differently, a row read by one mode is never served to the other
+    return f"{PIPELINE_VERSION}:{ocr_mode}:{image_fingerprint(crop, SKILL_FINGERPRINT_SIZE, SKILL_FINGERPRINT_LEVELS)}"
+
+def parse_skill_section(results: list[tuple[bool, str]]):
     unique_skills = []
     skills = []
 
-    for box in boxes:
-        if box[2] / box[3] < 5:
-            continue
-
-        is_unique_skill, skill_name = parse_skill(image, box)
+    for is_unique_skill, skill_name in results:
         if is_unique_skill:
             unique_skills.append(skill_name)
         else:
@@ -192,14 +214,16 @@ APTITUDES = [
     "End",
 ]
 
-def parse_aptitude(image: MatLike, box: tuple[int, int, int, int]):
-    crop = crop_image(image, (
+def get_aptitude_box(box: tuple[int, int, int, int]):
+    # aptitude section box to the box on the card
+    return (
         box[0] + 123,
         box[1] + 286,
         box[2],
         box[3]
-    ))
+    )
 
+def parse_aptitude(crop: MatLike, texts: list[str]):
     grade = crop_image(crop, (
         68,
         0,
@@ -209,8 +233,6 @@ def parse_aptitude(image: MatLike, box: tuple[int, int, int, int]):
     grade = posterization(grade, 10)
     grade = guess_grade(grade)
 
-    texts = ocr.predict(crop)[0]["rec_texts"]
-
     aptitude = None
 
     for text in texts:
@@ -221,7 +243,7 @@ def parse_aptitude(image: MatLike, box: tuple[int, int, int, int]):
     
     return aptitude, grade
 
-def parse_aptitude_section(image: MatLike):
+def get_aptitude_boxes(image: MatLike):
     crop = crop_image(image, (123, 286, image.shape[1] - 148, 102))
 
     floodfilled = cv2.floodFill(crop, None, (0, 0), (0, 0, 0), (5, 5, 5, 0), (10, 10, 10, 0))[1]
@@ -230,6 +252,9 @@ def parse_aptitude_section(image: MatLike):
     contours, _ = cv2.findContours(floodfilled, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     boxes = [cv2.boundingRect(contour) for contour in contours]
 
+    return [get_aptitude_box(box) for box in boxes if box[2] / box[3] >= 3.5]
+
+def parse_aptitude_section(crops: list[MatLike], texts: list[list[str]]):
     ret = {
         "Turf": "G",
         "Dirt": "G",
@@ -243,32 +268,21 @@ def parse_aptitude_section(image: MatLike):
         "End": "G",
     }
 
-    for box in boxes:
-        if box[2] / box[3] < 3.5:
-            continue
-
-        aptitude, grade = parse_aptitude(image, box)
+    for crop, aptitude_texts in zip(crops, texts):
+        aptitude, grade = parse_aptitude(crop, aptitude_texts)
         if aptitude is not None:
             ret[aptitude] = grade
 
     return ret
 
-def parse_name(img: MatLike):
-    name_section = crop_image(
-        img,
-        (256, 50, 287, 104),
-    )
+NAME_BOX = (256, 50, 287, 104)
 
-    texts = ocr.predict(name_section)[0]["rec_texts"]
+def parse_name(texts: list[str]):
     return ' '.join(texts)
 
 STAT_ATTRIBUTES = ["Speed", "Stamina", "Power", "Guts", "Wit"]
 
-def parse_stat(image: MatLike, box: tuple[int, int, int, int]):
-    stat = crop_image(image, box)
-
-    texts = ocr.predict(stat)[0]["rec_texts"]
-
+def parse_stat(texts: list[str]):
     attribute = None
 
     # any in text in texts matches one of the STAT_ATTRIBUTES
@@ -285,11 +299,17 @@ def parse_stat(image: MatLike, box: tuple[int, int, int, int]):
 
     return attribute, value
 
-def parse_stat_section(image: MatLike):
-    crop = crop_image(image, (13, 216, 528, 63))
+def get_stat_boxes():
+    # split the stat section (13, 216, 528, 63) into five pieces 528 / /5
+    boxes = []
+    for i in range(5):
+        start = (528 * i) // 5
+        end = (528 * (i + 1)) // 5
+        boxes.append((13 + start, 216, end - start, 63))
 
-    # split image into five pieces 528 / /5
+    return boxes
 
+def parse_stat_section(texts: list[list[str]]):
     ret = {
         "Speed": 0,
         "Stamina": 0,
@@ -298,18 +318,47 @@ def parse_stat_section(image: MatLike):
         "Wit": 0,
     }
 
-    for i in range(5):
-        start = (528 * i) // 5
-        end = (528 * (i + 1)) // 5
-
-        attribute, value = parse_stat(crop, (start, 0, end - start, crop.shape[0]))
+    for stat_texts in texts:
+        attribute, value = parse_stat(stat_texts)
 
         if attribute is not None and value is not None:
             ret[attribute] = value
 
     return ret
 
-def extract_image(path: str):
+def read_region_texts(image: MatLike, boxes: list[tuple[int, int, int, int]]) -> list[list[str]]:
+    # every region is cropped and the crops are read by a single ocr call
+    crops = [crop_image(image, box) for box in boxes]
+    with ocr_lock:
+        results = get_ocr().predict(crops)
+    return [result["rec_texts"] for result in results]
+
+def read_card_texts(image: MatLike, boxes: list[tuple[int, int, int, int]]) -> list[list[str]]:
+    # the whole card is read in one pass, each text goes to the region its center falls in
+    with ocr_lock:
+        result = get_ocr().predict(image)[0]
+    ret = [[] for _ in boxes]
+
+    for text, (x1, y1, x2, y2) in zip(result["rec_texts"], result["rec_boxes"]):
+        center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+        for idx, (x, y, w, h) in enumerate(boxes):
+            if x <= center_x < x + w and y <= center_y < y + h:
+                ret[idx].append(text)
+                break
+
+    return ret
+
+TEXT_READERS = {
+    "regions": read_region_texts,
+    "card": read_card_texts,
+}
+
+def extract_image(path: str, ocr_mode: str = "regions", skill_cache=None):
+    # skill_cache maps skill keys to (is_unique_skill, skill_name) through get_many and put_many,
+    # see utils/skill_cache.py
+    if ocr_mode not in TEXT_READERS:
+        raise Exception(f"Unknown ocr mode: {ocr_mode}")
+
     img = cv2.imread(path)
     # results = ocr.predict(img)
 
@@ -325,12 +374,40 @@ def extract_image(path: str):
     ])
     # please resize the height to 960 with keeping the aspect ratio
     img = cv2.resize(img, (int(img.shape[1] * 960 / img.shape[0]), 960))
-    unique_skills, skills = parse_skill_section(img)
+
+    # every region is located first, so the whole card is read by a single ocr call.
+    # the aptitude section is flood filled in place, so it is located last
+    skill_boxes = get_skill_boxes(img)
+    stat_boxes = get_stat_boxes()
+    aptitude_boxes = get_aptitude_boxes(img)
+
+    # skill rows look the same on every screenshot, the rows recognized before skip ocr and the marker detection
+    skill_crops = [crop_image(img, box) for box in skill_boxes]
+    skill_keys = [get_skill_key(crop, ocr_mode) for crop in skill_crops]
+    cached_skills = skill_cache.get_many(skill_keys) if skill_cache is not None else {}
+    unknown_skills = [idx for idx, key in enumerate(skill_keys) if key not in cached_skills]
+
+    texts = TEXT_READERS[ocr_mode](img, [NAME_BOX, *stat_boxes, *aptitude_boxes, *[skill_boxes[idx] for idx in unknown_skills]])
+    name_texts = texts[0]
+    stat_texts = texts[1:1 + len(stat_boxes)]
+    aptitude_texts = texts[1 + len(stat_boxes):1 + len(stat_boxes) + len(aptitude_boxes)]
+    skill_texts = texts[1 + len(stat_boxes) + len(aptitude_boxes):]
+
+    parsed_skills = {
+        skill_keys[idx]: parse_skill(skill_crops[idx], texts)
+        for idx, texts in zip(unknown_skills, skill_texts)
+    }
+    if skill_cache is not None:
+        # rows without any text are likely misdetected, they are read again next time
+        skill_cache.put_many({key: result for key, result in parsed_skills.items() if result[1]})
+
+    aptitude_crops = [crop_image(img, box) for box in aptitude_boxes]
+    unique_skills, skills = parse_skill_section([cached_skills.get(key) or parsed_skills[key] for key in skill_keys])
 
     return {
-        "name": parse_name(img),
-        "stats": parse_stat_section(img),
-        "aptitudes": parse_aptitude_section(img),
+        "name": parse_name(name_texts),
+        "stats": parse_stat_section(stat_texts),
+        "aptitudes": parse_aptitude_section(aptitude_crops, aptitude_texts),
         "unique_skills": unique_skills,
         "skills": skills,
     }
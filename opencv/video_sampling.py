@@ -0,0 +1,185 @@
+import math
+import shutil
+import subprocess
+import cv2
+import numpy as np
+
+# frame samplers yield (timestamp_ms, frame) tuples at (roughly) the requested fps.
+# the sampling is driven by the frame timestamps instead of the frame index, so
+# variable-frame-rate recordings from phones do not drift and low fps sources do
+# not break the sampling.
+
+def get_video_info(path: str):
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {
+            "fps": fps,
+            "frame_count": frame_count,
+            "duration_ms": frame_count * 1000 / fps if fps else 0,
+            "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        capture.release()
+
+class SamplingRate:
+    # sampling rate that could be changed while the frames are being sampled,
+    # every change is kept in the timeline as (timestamp_ms, fps)
+
+    def __init__(self, fps: float, min_fps: float = None, max_fps: float = None):
+        self.fps = fps
+        self.min_fps = min_fps or fps
+        self.max_fps = max_fps or fps
+        self.timeline: list[tuple[float, float]] = [(0.0, fps)]
+
+    def interval_ms(self) -> float:
+        return 1000 / self.fps
+
+    def set(self, timestamp: float, fps: float):
+        fps = min(max(fps, self.min_fps), self.max_fps)
+        if abs(fps - self.fps) < 0.5:
+            return
+
+        self.fps = fps
+        self.timeline.append((timestamp, fps))
+
+def to_sampling_rate(fps) -> SamplingRate:
+    return fps if isinstance(fps, SamplingRate) else SamplingRate(fps)
+
+def first_sample_timestamp(start_ms: float, interval: float) -> float:
+    # keep the samples on the same grid regardless of where the sampling starts
+    return math.ceil(start_ms / interval - 1e-6) * interval
+
+def sample_frames_opencv(path: str, fps, frame_size=None, start_ms: float = 0, end_ms: float = None):
+    rate = to_sampling_rate(fps)
+    capture = cv2.VideoCapture(path)
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    next_timestamp = first_sample_timestamp(start_ms, rate.interval_ms())
+    grabbed_count = 0
+
+    if start_ms > 0:
+        capture.set(cv2.CAP_PROP_POS_MSEC, start_ms)
+        grabbed_count = int(start_ms * native_fps / 1000)
+
+    try:
+        while True:
+            # grab only demuxes and decodes, the expensive conversion to BGR happens in retrieve
+            if not capture.grab():
+                break
+            grabbed_count += 1
+
+            timestamp = capture.get(cv2.CAP_PROP_POS_MSEC)
+            if timestamp <= 0 and grabbed_count > 1:
+                # some containers do not report timestamps, fall back to the nominal frame rate
+                timestamp = (grabbed_count - 1) * 1000 / native_fps
+
+            if end_ms is not None and timestamp >= end_ms:
+                break
+
+            if timestamp + 0.5 < next_timestamp:
+                continue
+
+            ret, frame = capture.retrieve()
+            if not ret:
+                break
+
+            if frame_size is not None:
+                size = frame_size(frame.shape[1], frame.shape[0])
+                if size != (frame.shape[1], frame.shape[0]):
+                    frame = cv2.resize(frame, size)
+
+            yield timestamp, frame
+
+            # the rate could have been changed while the frame was processed
+            while next_timestamp <= timestamp + 0.5:
+                next_timestamp += rate.interval_ms()
+    finally:
+        capture.release()
+
+def is_ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+def read_exactly(stream, buffer: bytearray) -> bool:
+    view = memoryview(buffer)
+    read = 0
+    while read < len(buffer):
+        n = stream.readinto(view[read:])
+        if not n:
+            return False
+        read += n
+    return True
+
+def sample_frames_ffmpeg(path: str, fps, frame_size=None, start_ms: float = 0, end_ms: float = None):
+    # ffmpeg decodes at the highest rate, frames are dropped here when the rate is lowered,
+    # so a lower rate saves the later stages but not the decoding
+    rate = to_sampling_rate(fps)
+    fps = rate.max_fps
+    info = get_video_info(path)
+    width, height = info["width"], info["height"]
+    if frame_size is not None:
+        width, height = frame_size(width, height)
+
+    start_ms = first_sample_timestamp(start_ms, 1000 / fps)
+    range_args = ["-ss", f"{start_ms / 1000:.3f}"] if start_ms > 0 else []
+    if end_ms is not None:
+        range_args += ["-t", f"{max(end_ms - start_ms, 0) / 1000:.3f}"]
+
+    # the fps and scale filters are applied while decoding, so only the sampled frames
+    # are ever converted and copied into python
+    process = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-loglevel", "error",
+            *range_args,
+            "-i", path,
+            "-vf", f"fps={fps},scale={width}:{height}",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+    frame_bytes = width * height * 3
+    frame_idx = 0
+    next_timestamp = start_ms
+
+    try:
+        while True:
+            # the frames are modified in place further down the pipeline, so they need their own writable buffer
+            buffer = bytearray(frame_bytes)
+            if not read_exactly(process.stdout, buffer):
+                break
+
+            timestamp = start_ms + frame_idx * 1000 / fps
+            frame_idx += 1
+
+            if timestamp + 0.5 < next_timestamp:
+                continue
+
+            yield timestamp, np.frombuffer(buffer, dtype=np.uint8).reshape((height, width, 3))
+
+            while next_timestamp <= timestamp + 0.5:
+                next_timestamp += rate.interval_ms()
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+FRAME_SAMPLERS = {
+    "opencv": sample_frames_opencv,
+    "ffmpeg": sample_frames_ffmpeg,
+}
+
+def sample_frames(path: str, fps, backend: str = "opencv", frame_size=None, start_ms: float = 0, end_ms: float = None):
+    if backend not in FRAME_SAMPLERS:
+        raise Exception(f"Unknown video backend: {backend}")
+
+    if backend == "ffmpeg" and not is_ffmpeg_available():
+        print("ffmpeg is not available, falling back to opencv")
+        backend = "opencv"
+
+    return FRAME_SAMPLERS[backend](path, fps, frame_size, start_ms, end_ms)
@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+
+def parse_line(line: bytes):
+    if not line.endswith(b"\n"):
+        return None
+
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+class Checkpoint:
+    """Append-only JSON lines file, used to resume long jobs after the bot restarts"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> list[dict]:
+        if not self.exists():
+            return []
+
+        entries = []
+        with self._lock, open(self.path, "rb+") as f:
+            offset = 0
+            for line in f:
+                entry = parse_line(line)
+                if entry is None:
+                    # the process died while writing the last line, drop it so new lines start clean
+                    f.truncate(offset)
+                    break
+
+                entries.append(entry)
+                offset += len(line)
+        return entries
+
+    def append(self, entry: dict):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def remove(self):
+        with self._lock:
+            if self.exists():
+                os.remove(self.path)
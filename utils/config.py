@@ -16,6 +16,27 @@ def get_client_id():
 def get_database_url():
     return os.getenv('DATABASE_URL')
 
+def get_video_backend():
+    return os.getenv('VIDEO_BACKEND', 'opencv')
+
+def get_video_workers():
+    return int(os.getenv('VIDEO_WORKERS', '1'))
+
+def get_video_ocr_mode():
+    return os.getenv('VIDEO_OCR_MODE', 'full')
+
+def get_video_adaptive_sampling():
+    return os.getenv('VIDEO_ADAPTIVE_SAMPLING', 'false').lower() in ('1', 'true', 'yes')
+
+def get_veteran_ocr_mode():
+    return os.getenv('VETERAN_OCR_MODE', 'regions')
+
+def get_skill_cache_size():
+    return int(os.getenv('SKILL_CACHE_SIZE', '20000'))
+
+def get_result_cache_ttl_hours():
+    return float(os.getenv('RESULT_CACHE_TTL_HOURS', '168'))
+
 def init_env():
     BASE64_SERVICE_ACOUNT = os.getenv('FILE_SERVICE_ACCOUNT_JSON_BASE64')
     if BASE64_SERVICE_ACOUNT is not None:
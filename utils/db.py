@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, Float, Boolean, String, DateTime, ForeignKey, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
@@ -69,6 +69,79 @@ class Preset(Base):
     created_by = Column(String, nullable=False)
     created_at = Column(DateTime, default=func.now(), nullable=False)
 
+class VideoJob(Base):
+    __tablename__ = 'video_job'
+
+    # do not touch, primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    # where the video was uploaded, the club id is not a foreign key so the history outlives the club
+    guild_id = Column(String, nullable=False)
+    channel_id = Column(String, nullable=False)
+    message_id = Column(String, nullable=False)
+    club_id = Column(Integer)
+
+    # pipeline settings
+    backend = Column(String, nullable=False)
+    ocr_mode = Column(String, nullable=False)
+    workers = Column(Integer, nullable=False)
+
+    # outcome
+    status = Column(String, nullable=False)
+    error = Column(Text)
+    members = Column(Integer)
+    processing_seconds = Column(Float, nullable=False)
+    video_duration_ms = Column(Float)
+
+    # counters
+    frames_sampled = Column(Integer)
+    frames_skipped = Column(Integer)
+    rows_detected = Column(Integer)
+    ocr_calls = Column(Integer)
+    ocr_cache_hits = Column(Integer)
+    ocr_cache_misses = Column(Integer)
+
+    # seconds spent per stage
+    decode_seconds = Column(Float)
+    optimize_seconds = Column(Float)
+    detect_seconds = Column(Float)
+    ocr_seconds = Column(Float)
+    aggregate_seconds = Column(Float)
+
+    # every stat of the job as json
+    stats = Column(Text)
+
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+class ResultCache(Base):
+    __tablename__ = 'result_cache'
+
+    # sha256 of the pipeline version and the attachment bytes
+    key = Column(String, primary_key=True)
+
+    # which pipeline produced the result, e.g. club_video or veteran_uma
+    kind = Column(String, nullable=False)
+    # the extracted result as json
+    result = Column(Text, nullable=False)
+
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class SkillCache(Base):
+    __tablename__ = 'skill_cache'
+
+    # pipeline version, ocr mode and fingerprint of the normalized skill row
+    key = Column(String, primary_key=True)
+
+    # skill name with its marker, as parse_skill returns it
+    name = Column(String, nullable=False)
+    is_unique = Column(Boolean, nullable=False)
+
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    # the least recently used rows are dropped once the table is full
+    last_used_at = Column(DateTime, default=func.now(), nullable=False)
+
 # Database setup
 engine = create_engine(get_database_url(), pool_pre_ping=True, pool_recycle=300)
 SessionLocal = sessionmaker(bind=engine)
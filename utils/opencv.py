@@ -1,7 +1,10 @@
+import functools
+import hashlib
+import threading
 import numpy as np
 import cv2
 from cv2.typing import MatLike
-from paddleocr import PaddleOCR
+from paddleocr import PaddleOCR, TextRecognition
 
 # ocr
 
@@ -16,11 +19,33 @@ def init_paddleocr():
         use_doc_unwarping=False, 
         use_textline_orientation=False,
         return_word_box=False,
+        text_recognition_batch_size=16,
     )
 
 def is_paddleocr_initialized():
     return ocr is not None
 
+def get_ocr():
+    return ocr
+
+# the paddle predictors are not thread-safe, extractions running on other threads take turns on the model
+ocr_lock = threading.Lock()
+
+# recognition only model, for text regions whose location is already known
+
+text_recognizer = None
+_text_recognizer_lock = threading.Lock()
+
+def get_text_recognizer():
+    global text_recognizer
+    with _text_recognizer_lock:
+        if text_recognizer is None:
+            text_recognizer = TextRecognition(model_name='en_PP-OCRv5_mobile_rec')
+    return text_recognizer
+
+# the recognizer is a predictor of its own, it is not thread-safe either
+text_recognizer_predict_lock = threading.Lock()
+
 # opencv
 
 def hex_to_bgr(hex_color):
@@ -30,23 +55,43 @@ def hex_to_bgr(hex_color):
     b = int(hex_color[4:6], 16)
     return np.array([b, g, r])
 
-def create_binary_mask(image: MatLike, target_colors: list[str], tolerance: int = 0) -> MatLike:
-    combined_mask = np.zeros(image.shape[:2], dtype=bool)
-    
-    for color in target_colors:
-        target_bgr = hex_to_bgr(color)
-        diff = np.abs(image.astype(np.int16) - target_bgr.astype(np.int16))
-        color_mask = np.all(diff <= tolerance, axis=2)
-        combined_mask = combined_mask | color_mask
-    
-    binary_image = np.zeros_like(image)
-    binary_image[combined_mask] = [255, 255, 255]
-    binary_image[~combined_mask] = [0, 0, 0]
-    
-    return binary_image
+@functools.lru_cache(maxsize=None)
+def color_bounds(color: str, tolerance: int) -> tuple[np.ndarray, np.ndarray]:
+    bgr = hex_to_bgr(color)
+    lower = np.clip(bgr - tolerance, 0, 255).astype(np.uint8)
+    upper = np.clip(bgr + tolerance, 0, 255).astype(np.uint8)
+    return lower, upper
+
+def get_buffer(buffers: dict, name: str, shape: tuple[int, ...]) -> np.ndarray:
+    # reuse the same scratch memory across frames as long as the frame size does not change
+    if buffers is None:
+        return None
+
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = buffers[name] = np.empty(shape, dtype=np.uint8)
+    return buffer
+
+def create_color_mask(image: MatLike, target_colors: list, tolerance: int = 0, out: MatLike = None, scratch: MatLike = None) -> MatLike:
+    # single channel 0/255 mask of the pixels within tolerance of any of the target colors,
+    # a target color could also be a (color, tolerance) tuple to override the tolerance
+    for idx, color in enumerate(target_colors):
+        color, color_tolerance = color if isinstance(color, tuple) else (color, tolerance)
+        lower, upper = color_bounds(color, color_tolerance)
+
+        if idx == 0:
+            out = cv2.inRange(image, lower, upper, dst=out)
+        else:
+            scratch = cv2.inRange(image, lower, upper, dst=scratch)
+            cv2.bitwise_or(out, scratch, dst=out)
+
+    return out
+
+def to_gray(image: MatLike) -> MatLike:
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
 def find_white_regions(image: MatLike, threshold: float = 0.5, min_width: int = 50, min_height: int = 20) -> list[tuple[int, int, int, int]]:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(image)
     
     contours, _ = cv2.findContours(gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
@@ -60,7 +105,7 @@ def find_white_regions(image: MatLike, threshold: float = 0.5, min_width: int =
             continue
         
         roi = gray[y:y+h, x:x+w]
-        white_pixels = np.sum(roi == 255)
+        white_pixels = np.count_nonzero(roi == 255)
         total_pixels = roi.size
         white_ratio = white_pixels / total_pixels
         
@@ -70,24 +115,41 @@ def find_white_regions(image: MatLike, threshold: float = 0.5, min_width: int =
     return bounding_boxes
 
 def remove_noise(image: MatLike, min_area: int = 50) -> MatLike:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    contours, _ = cv2.findContours(gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    result = image.copy()
-    result_gray = gray.copy()
+    # single channel masks are cleaned in place, color images are returned as a new color image
+    is_mask = image.ndim == 2
+    result_gray = image if is_mask else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
-    removed_count = 0
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area < min_area:
-            cv2.fillPoly(result_gray, [contour], 0)
-            removed_count += 1
+    contours, _ = cv2.findContours(result_gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    result = cv2.cvtColor(result_gray, cv2.COLOR_GRAY2BGR)
+    small_contours = [contour for contour in contours if cv2.contourArea(contour) < min_area]
+    if small_contours:
+        cv2.fillPoly(result_gray, small_contours, 0)
     
-    return result
+    if is_mask:
+        return result_gray
+
+    return cv2.cvtColor(result_gray, cv2.COLOR_GRAY2BGR)
+
+@functools.lru_cache(maxsize=None)
+def get_ellipse_kernel(radius: int) -> MatLike:
+    kernel_size = 2 * radius + 1
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+
+def expand_white_areas(image: MatLike, radius: int, out: MatLike = None) -> MatLike:
+    expanded = cv2.dilate(to_gray(image), get_ellipse_kernel(radius), dst=out, iterations=1)
+    return expanded if image.ndim == 2 else cv2.cvtColor(expanded, cv2.COLOR_GRAY2BGR)
+
+def shrink_white_areas(image: MatLike, radius: int, out: MatLike = None) -> MatLike:
+    shrunk = cv2.erode(to_gray(image), get_ellipse_kernel(radius), dst=out, iterations=1)
+    return shrunk if image.ndim == 2 else cv2.cvtColor(shrunk, cv2.COLOR_GRAY2BGR)
 
 def crop_image(image: MatLike, box: tuple[int, int, int, int]):
     x, y, w, h = box
-    return image[y:y+h, x:x+w]
\ No newline at end of file
+    return image[y:y+h, x:x+w]
+
+def image_fingerprint(image: MatLike, size: tuple[int, int] = (128, 32), levels: int = 16) -> str:
+    # downscale and quantize before hashing, so resampling noise between frames maps to the same key
+    gray = to_gray(image)
+    thumbnail = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    quantized = (thumbnail // (256 // levels)).astype(np.uint8)
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
\ No newline at end of file
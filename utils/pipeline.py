@@ -0,0 +1,71 @@
+import queue
+import threading
+import typing
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _iterate(source: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            item = source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+def _run_stage(items: typing.Iterable, out: queue.Queue, stop: threading.Event):
+    try:
+        for item in items:
+            if not _put(out, item, stop):
+                return
+        _put(out, _DONE, stop)
+    except BaseException as e:
+        _put(out, _Failure(e), stop)
+    finally:
+        # release the resources of stages stopped halfway, like an open video
+        if hasattr(items, "close"):
+            items.close()
+
+def run_pipeline(source: typing.Iterable, stages: list[typing.Callable], queue_size: int = 8):
+    """
+    Streams items from the source through each stage, every stage running on its own thread.
+    A stage takes an iterator of items and yields items, stages are connected by bounded queues.
+    Errors raised by any stage are re-raised to the consumer of the pipeline.
+    """
+    stop = threading.Event()
+    threads = []
+
+    items = source
+    for stage in [None] + stages:
+        if stage is not None:
+            items = stage(items)
+
+        out = queue.Queue(queue_size)
+        thread = threading.Thread(target=_run_stage, args=(items, out, stop), daemon=True)
+        thread.start()
+        threads.append(thread)
+        items = _iterate(out, stop)
+
+    try:
+        yield from items
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,49 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from utils.config import get_result_cache_ttl_hours
+from utils.db import SessionLocal, ResultCache
+
+# results of re-posted attachments are looked up by the hash of their bytes, the pipeline
+# version is hashed in as well so results of an older pipeline are never returned
+
+def get_content_key(path: str, kind: str, version: str) -> str:
+    digest = hashlib.sha256(f"{kind}:{version}\n".encode("utf-8"))
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_cached_result(key: str):
+    session = SessionLocal()
+    try:
+        entry = session.query(ResultCache).filter(
+            ResultCache.key == key,
+            ResultCache.expires_at > datetime.utcnow(),
+        ).first()
+        return json.loads(entry.result) if entry else None
+    except Exception as e:
+        print(f"Database error while reading result cache: {e}")
+        return None
+    finally:
+        session.close()
+
+def set_cached_result(key: str, kind: str, result):
+    session = SessionLocal()
+    now = datetime.utcnow()
+    try:
+        # the expired entries are dropped on write, so the table does not grow forever
+        session.query(ResultCache).filter(ResultCache.expires_at <= now).delete()
+        session.merge(ResultCache(
+            key=key,
+            kind=kind,
+            result=json.dumps(result),
+            created_at=now,
+            expires_at=now + timedelta(hours=get_result_cache_ttl_hours()),
+        ))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Database error while writing result cache: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,56 @@
+from datetime import datetime
+from utils.db import SessionLocal, SkillCache
+
+class SkillRowCache:
+    """Skill rows recognized on earlier screenshots, persisted in the database and bounded by size"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[bool, str]]:
+        if not keys:
+            return {}
+
+        session = SessionLocal()
+        try:
+            entries = session.query(SkillCache).filter(SkillCache.key.in_(set(keys))).all()
+            now = datetime.utcnow()
+            for entry in entries:
+                entry.hits += 1
+                entry.last_used_at = now
+            session.commit()
+            return {entry.key: (entry.is_unique, entry.name) for entry in entries}
+        except Exception as e:
+            session.rollback()
+            print(f"Database error while reading skill cache: {e}")
+            return {}
+        finally:
+            session.close()
+
+    def put_many(self, entries: dict[str, tuple[bool, str]]):
+        if not entries:
+            return
+
+        session = SessionLocal()
+        now = datetime.utcnow()
+        try:
+            for key, (is_unique, name) in entries.items():
+                session.merge(SkillCache(
+                    key=key,
+                    name=name,
+                    is_unique=is_unique,
+                    hits=0,
+                    created_at=now,
+                    last_used_at=now,
+                ))
+            session.flush()
+
+            # keep the most recently used rows only
+            stale = session.query(SkillCache.key).order_by(SkillCache.last_used_at.desc()).offset(self.max_size)
+            session.query(SkillCache).filter(SkillCache.key.in_(stale.scalar_subquery())).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Database error while writing skill cache: {e}")
+        finally:
+            session.close()